@@ -0,0 +1,250 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+# ---------------- Admission control ----------------
+# Every API request is put in a route class and charged one token from a
+# per-caller bucket for that class:
+#   auth  - /login, /register, keyed by client IP (X-Forwarded-For is only
+#           honoured with TRUSTED_PROXY_COUNT set to the number of proxies)
+#   write - POST/PUT/DELETE under /api, keyed by JWT identity (IP if anonymous)
+#   read  - other /api requests, keyed the same way
+# An empty bucket gets 429 with Retry-After. On top of that, write requests
+# share a concurrency limit (RATE_LIMIT_MAX_WRITES in flight per process); when
+# it is reached the request waits up to RATE_LIMIT_WRITE_QUEUE_MS and is then
+# shed with 503 + Retry-After, so requests don't pile up behind SQLite's writer.
+#
+# RATE_LIMIT_BACKEND="shared" keeps the buckets in a memory-mapped file (in
+# /dev/shm when available) so all gunicorn workers on the host see the same
+# limits; "local" keeps them in this process only.
+
+DEFAULT_LIMITS = {  # class: (tokens per second, burst)
+    "read": (20.0, 40),
+    "write": (5.0, 10),
+    "auth": (1.0, 5),
+}
+AUTH_PATHS = ("/login", "/register")
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+def parse_limit(value, default):
+    """"rate/burst" from the environment, e.g. "5/10" (burst defaults to the rate, at least 1)."""
+    if not value:
+        return default
+    rate, _, burst = value.partition("/")
+    try:
+        rate = float(rate)
+        burst = int(burst) if burst else max(1, int(rate))
+    except ValueError:
+        raise ValueError(f"rate limit {value!r} is not of the form rate/burst, e.g. 5/10")
+    return check_limit(rate, burst)
+
+
+def check_limit(rate, burst):
+    if not rate > 0:
+        raise ValueError(f"rate limit rate must be above 0, got {rate}")
+    if burst < 1:
+        raise ValueError(f"rate limit burst must be at least 1, got {burst}")
+    return float(rate), int(burst)
+
+
+def take(tokens, stamp, now, rate, burst):
+    """Token-bucket step. Returns (allowed, tokens, retry_after_seconds)."""
+    tokens = min(float(burst), tokens + (now - stamp) * rate)
+    if tokens >= 1.0:
+        return True, tokens - 1.0, 0.0
+    return False, tokens, (1.0 - tokens) / rate
+
+
+class LocalBuckets:
+    def __init__(self, max_keys=50000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, rate, burst, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, stamp = self._buckets.pop(key, (float(burst), now))
+            allowed, tokens, retry = take(tokens, stamp, now, rate, burst)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry
+
+
+class SharedBuckets:
+    """Fixed-size open-addressing table of buckets in a shared mmap file."""
+
+    SLOT = struct.Struct("<Qdd")  # key hash, tokens, stamp
+    PROBES = 8
+
+    def __init__(self, path, slots=65536):
+        self.slots = slots
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = slots * self.SLOT.size
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()  # flock alone doesn't order threads of one process
+
+    def _read(self, slot):
+        return self.SLOT.unpack_from(self._map, slot * self.SLOT.size)
+
+    def hit(self, key, rate, burst, now=None):
+        # Wall clock, since the timestamps are compared across processes
+        now = time.time() if now is None else now
+        h = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                slot = self._find_slot(h, now)
+                key, tokens, stamp = self._read(slot)
+                if key != h:
+                    tokens, stamp = float(burst), now
+                allowed, tokens, retry = take(tokens, stamp, now, rate, burst)
+                self.SLOT.pack_into(self._map, slot * self.SLOT.size, h, tokens, now)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return allowed, retry
+
+    def _find_slot(self, h, now):
+        # Reuse our slot, else an empty one, else the least recently used probe
+        start = h % self.slots
+        oldest, oldest_stamp = start, None
+        for i in range(self.PROBES):
+            slot = (start + i) % self.slots
+            key, _, stamp = self._read(slot)
+            if key == h or key == 0:
+                return slot
+            if oldest_stamp is None or stamp < oldest_stamp:
+                oldest, oldest_stamp = slot, stamp
+        return oldest
+
+
+class AdmissionControl:
+    def __init__(self, app=None):
+        self.buckets = None
+        self.limits = dict(DEFAULT_LIMITS)
+        self._write_slots = None
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("RATE_LIMIT_ENABLED", True)
+        app.config.setdefault("RATE_LIMIT_BACKEND", "local")
+        app.config.setdefault("RATE_LIMIT_SHM_PATH", os.path.join(
+            "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "mhss-rate-limits"))
+        app.config.setdefault("RATE_LIMITS", DEFAULT_LIMITS)
+        app.config.setdefault("RATE_LIMIT_MAX_WRITES", 8)
+        app.config.setdefault("RATE_LIMIT_WRITE_QUEUE_MS", 100)
+        app.config.setdefault("TRUSTED_PROXY_COUNT", 0)
+        self.app = app
+        self.limits = {name: check_limit(*limit) for name, limit in app.config["RATE_LIMITS"].items()}
+        if app.config["TRUSTED_PROXY_COUNT"]:
+            # Only then is X-Forwarded-For ours to believe (set by that many proxies in front)
+            app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["TRUSTED_PROXY_COUNT"])
+        if app.config["RATE_LIMIT_BACKEND"] == "shared":
+            self.buckets = SharedBuckets(app.config["RATE_LIMIT_SHM_PATH"])
+        else:
+            self.buckets = LocalBuckets()
+        self._write_slots = threading.BoundedSemaphore(app.config["RATE_LIMIT_MAX_WRITES"])
+        self._max_writes = app.config["RATE_LIMIT_MAX_WRITES"]
+        self._in_flight = 0
+        app.before_request(self.before_request)
+        app.teardown_request(self.teardown_request)
+
+    def before_request(self):
+        if not self.app.config["RATE_LIMIT_ENABLED"]:
+            return None
+        route_class = classify(request.method, request.path)
+        if route_class is None:
+            return None
+
+        rate, burst = self.limits[route_class]
+        allowed, retry = self.buckets.hit(f"{route_class}:{caller(route_class)}", rate, burst)
+        if not allowed:
+            self._count(route_class, "limited")
+            return _reject(429, "Too many requests, slow down", retry)
+
+        if route_class == "write":
+            wait = self.app.config["RATE_LIMIT_WRITE_QUEUE_MS"] / 1000.0
+            if not self._write_slots.acquire(timeout=wait):
+                self._count(route_class, "shed")
+                return _reject(503, "Server is busy, try again shortly", 1)
+            g.admission_write_slot = True
+            with self._metrics_lock:
+                self._in_flight += 1
+        self._count(route_class, "allowed")
+        return None
+
+    def teardown_request(self, exc=None):
+        if g.pop("admission_write_slot", False):
+            with self._metrics_lock:
+                self._in_flight -= 1
+            self._write_slots.release()
+
+    def _count(self, route_class, outcome):
+        with self._metrics_lock:
+            key = (route_class, outcome)
+            self._metrics[key] = self._metrics.get(key, 0) + 1
+
+    def metrics(self):
+        with self._metrics_lock:
+            counters = {}
+            for (route_class, outcome), count in self._metrics.items():
+                counters.setdefault(route_class, {})[outcome] = count
+            return {
+                "pid": os.getpid(),
+                "backend": self.app.config["RATE_LIMIT_BACKEND"],
+                "limits": {c: {"rate": r, "burst": b} for c, (r, b) in self.limits.items()},
+                "requests": counters,
+                "writes_in_flight": self._in_flight,
+                "max_writes_in_flight": self._max_writes,
+            }
+
+
+def classify(method, path):
+    if path in AUTH_PATHS:
+        return "auth"
+    if not path.startswith("/api/"):
+        return None  # React frontend and static files
+    if method == "OPTIONS":
+        return None  # CORS preflight
+    return "write" if method in WRITE_METHODS else "read"
+
+
+def caller(route_class):
+    if route_class != "auth":
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except Exception:
+            identity = None  # bad/expired tokens are rejected by the view itself
+        if identity:
+            return f"user:{identity}"
+    # remote_addr is the peer, or the client ProxyFix found behind TRUSTED_PROXY_COUNT
+    # proxies; a client-supplied X-Forwarded-For would give it a new bucket per request
+    return f"ip:{request.remote_addr}"
+
+
+def _reject(status, message, retry_after):
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+
+admission = AdmissionControl()
@@ -0,0 +1,34 @@
+import os
+import tempfile
+import time
+
+from flask import Flask
+
+from models import db
+
+
+def make_app(db_path=None, **config):
+    """A bare Flask app bound to a scratch SQLite file, for benchmarks."""
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        os.unlink(db_path)
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config.update(config)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    app.db_path = db_path
+    return app
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def report(label, count, seconds):
+    print(f"{label:<40} {count:>7} ops  {seconds:7.3f}s  {count / seconds:10.0f} ops/s")
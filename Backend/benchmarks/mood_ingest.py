@@ -0,0 +1,103 @@
+"""POST /api/mood throughput: the full app vs the standalone ingest app.
+
+Run from Backend/:  python -m benchmarks.mood_ingest [--requests N] [--threads N]
+
+Each variant runs in its own process (they share the mood_writer singleton)
+against a scratch database, with write-behind on and strict acks. Requests go
+through the Flask test client, so this measures the app's own per-request cost
+without HTTP.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def import_cost(module):
+    """(seconds, modules loaded) for importing module in a fresh interpreter."""
+    code = ("import sys, time; t = time.perf_counter(); import {0}; "
+            "print(time.perf_counter() - t, len(sys.modules))").format(module)
+    env = dict(os.environ, PURGE_WORKER="0")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    seconds, modules = out.stdout.split()
+    return float(seconds), int(modules)
+
+
+def load_app(variant):
+    if variant == "main":
+        os.environ.update(MOOD_WRITE_BEHIND="1", MOOD_WRITE_ACK="strict",
+                          PURGE_WORKER="0", RATE_LIMIT_ENABLED="0")
+        from myapp import app
+        return app
+    from mood_routes import create_app
+    return create_app({"MOOD_WRITE_ACK": "strict", "RATE_LIMIT_ENABLED": False})
+
+
+def bench(variant, requests, threads):
+    fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    app = load_app(variant)
+
+    from flask_jwt_extended import create_access_token
+    from models import db, User, MoodEntry
+    with app.app_context():
+        db.create_all()
+        user = User(username="bench", email="bench@example.com", password="x")
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=user.email, additional_claims={"uid": user.id})
+    headers = {"Authorization": f"Bearer {token}"}
+    per_thread = requests // threads
+    failures = []
+
+    def work():
+        client = app.test_client()
+        for _ in range(per_thread):
+            response = client.post("/api/mood", json={"mood": "good", "note": "bench"}, headers=headers)
+            if response.status_code != 201:
+                failures.append(response.status_code)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    seconds = time.perf_counter() - start
+
+    with app.app_context():
+        saved = MoodEntry.query.count()
+    os.unlink(db_path)
+    print(f"{seconds} {per_thread * threads} {saved} {len(failures)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--variant", choices=("main", "ingest"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.variant:
+        bench(args.variant, args.requests, args.threads)
+        return
+
+    from benchmarks.common import report
+    for label, module in (("import myapp", "myapp"), ("import mood_routes", "mood_routes")):
+        seconds, modules = import_cost(module)
+        print(f"{label:<40} {modules:>7} modules {seconds:6.3f}s")
+    for label, variant in (("full app, POST /api/mood", "main"), ("ingest app, POST /api/mood", "ingest")):
+        out = subprocess.run([sys.executable, "-m", "benchmarks.mood_ingest", "--variant", variant,
+                              "--requests", str(args.requests), "--threads", str(args.threads)],
+                             capture_output=True, text=True, check=True)
+        seconds, sent, saved, failed = out.stdout.split()[-4:]
+        report(label, int(sent), float(seconds))
+        if int(failed) or int(saved) != int(sent):
+            print(f"  {failed} failed request(s), {saved} of {sent} rows saved")
+
+
+if __name__ == "__main__":
+    main()
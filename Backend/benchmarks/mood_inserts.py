@@ -0,0 +1,81 @@
+"""Mood inserts per second: commit-per-row vs write-behind group commits.
+
+Run from Backend/:  python -m benchmarks.mood_inserts [--rows N] [--threads N]
+"""
+import argparse
+import os
+import threading
+
+from models import db, User, MoodEntry
+from write_behind import MoodWriter
+from benchmarks.common import make_app, timed, report
+
+
+def seed_user(app):
+    with app.app_context():
+        user = User(username="bench", email="bench@example.com", password="x")
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def run_threads(threads, per_thread, work):
+    workers = [threading.Thread(target=work, args=(per_thread,)) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+
+def bench_direct(rows, threads):
+    app = make_app()
+    user_id = seed_user(app)
+
+    def work(n):
+        with app.app_context():
+            for _ in range(n):
+                db.session.add(MoodEntry(user_id=user_id, mood="good", note="bench"))
+                db.session.commit()
+
+    seconds, _ = timed(run_threads, threads, rows // threads, work)
+    os.unlink(app.db_path)
+    return seconds
+
+
+def bench_write_behind(rows, threads, strict):
+    app = make_app(MOOD_WRITE_BEHIND=True, MOOD_WRITE_ACK="strict" if strict else "queued")
+    writer = MoodWriter(app)
+    user_id = seed_user(app)
+
+    def work(n):
+        for _ in range(n):
+            pending = writer.submit(user_id, "good", "bench")
+            if strict:
+                pending.wait(30)
+
+    def run():
+        run_threads(threads, rows // threads, work)
+        writer.flush(30)
+
+    seconds, _ = timed(run)
+    writer.stop(5)
+    with app.app_context():
+        assert MoodEntry.query.count() == rows // threads * threads
+    os.unlink(app.db_path)
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+    rows = args.rows // args.threads * args.threads
+
+    report("commit per row", rows, bench_direct(rows, args.threads))
+    report("write-behind, strict ack", rows, bench_write_behind(rows, args.threads, True))
+    report("write-behind, queued ack", rows, bench_write_behind(rows, args.threads, False))
+
+
+if __name__ == "__main__":
+    main()
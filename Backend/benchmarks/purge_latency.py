@@ -0,0 +1,91 @@
+"""Write latency for other users while one heavy account is deleted.
+
+Compares one big DELETE transaction with the batched purge worker.
+
+Run from Backend/:  python -m benchmarks.purge_latency [--rows N]
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+
+from models import db, User, MoodEntry, PurgeJob
+from purge import PurgeWorker
+from benchmarks.common import make_app
+
+
+def setup(rows):
+    app = make_app(PURGE_PAUSE_MS=5)
+    with app.app_context():
+        victim = User(username="heavy", email="heavy@example.com", password="x")
+        other = User(username="other", email="other@example.com", password="x")
+        db.session.add_all([victim, other])
+        db.session.commit()
+        db.session.execute(MoodEntry.__table__.insert(), [
+            dict(user_id=victim.id, mood="sad", note="a fairly ordinary journal note", timestamp=datetime.utcnow())
+            for _ in range(rows)])
+        db.session.commit()
+        return app, victim.id, other.id
+
+
+def measure_writes(app, user_id, stop):
+    """Commit one mood row every few ms until stop is set; return latencies in ms."""
+    latencies = []
+    with app.app_context():
+        while not stop.is_set():
+            start = time.perf_counter()
+            db.session.add(MoodEntry(user_id=user_id, mood="good"))
+            db.session.commit()
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.005)
+    return latencies
+
+
+def run(label, app, other_id, delete):
+    stop = threading.Event()
+    result = {}
+    writer = threading.Thread(target=lambda: result.setdefault("lat", measure_writes(app, other_id, stop)))
+    writer.start()
+    time.sleep(0.2)
+    start = time.perf_counter()
+    delete()
+    seconds = time.perf_counter() - start
+    time.sleep(0.2)
+    stop.set()
+    writer.join()
+    lat = sorted(result["lat"])
+    pct = lambda p: lat[min(len(lat) - 1, int(len(lat) * p))]
+    print(f"{label:<24} purge {seconds:6.2f}s   other writes: n={len(lat):5d} "
+          f"p50={pct(0.5):6.1f}ms p99={pct(0.99):7.1f}ms max={lat[-1]:7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    app, victim_id, other_id = setup(args.rows)
+
+    def naive():
+        with app.app_context():
+            MoodEntry.query.filter_by(user_id=victim_id).delete()
+            db.session.commit()
+    run("single transaction", app, other_id, naive)
+    os.unlink(app.db_path)
+
+    app, victim_id, other_id = setup(args.rows)
+    worker = PurgeWorker(app)
+    worker.token = "bench"
+
+    def batched():
+        with app.app_context():
+            db.session.add(PurgeJob(user_id=victim_id, email="heavy@example.com"))
+            db.session.commit()
+            worker.run_once()
+    run("batched purge worker", app, other_id, batched)
+    os.unlink(app.db_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Time scoring a large resource catalog against a mood distribution.
+
+Run from Backend/:  python -m benchmarks.recommendations [--resources N]
+"""
+import argparse
+import random
+import time
+
+from recommendations import ResourceIndex, MOOD_TAG_AFFINITY, mood_distribution
+from benchmarks.common import report, timed
+
+EXTRA_TAGS = [f"topic{i}" for i in range(200)]
+
+
+def build(n, seed=0):
+    rng = random.Random(seed)
+    known = sorted({t for tags in MOOD_TAG_AFFINITY.values() for t in tags})
+    vocab = known + EXTRA_TAGS
+    index = ResourceIndex()
+    index.add([(i, rng.sample(vocab, rng.randint(1, 5)), rng.random() < 0.3)
+               for i in range(1, n + 1)])
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resources", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    seconds, index = timed(build, args.resources)
+    print(f"built {index.size} x {len(index.tags)} index in {seconds * 1000:.0f} ms")
+
+    weights = mood_distribution(["sad", "sad", "angry", "neutral"], index.moods)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        index.recommend(weights, 10)
+    seconds = time.perf_counter() - start
+    report(f"top-10 over {index.size} resources", args.repeat, seconds)
+    print(f"{seconds / args.repeat * 1000:.2f} ms per recommendation")
+
+    seconds, _ = timed(index.add, [(args.resources + 1, ["sleep", "insomnia"], True)])
+    print(f"incremental add of one resource with a new tag: {seconds * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Mood write throughput as the number of shards grows.
+
+Each worker process (standing in for a gunicorn worker) plays a different user
+and commits one mood entry per insert, so with more shards the writes spread
+over more SQLite writer locks.
+
+Run from Backend/:  python -m benchmarks.shard_writes [--rows N] [--workers N] [--shards 1,2,4,8]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import multiprocessing
+
+import shards
+from models import db, MoodEntry
+from benchmarks.common import make_app, timed, report
+
+
+def dispose_engines(app):
+    with app.app_context():
+        for engine in shards.shard_engines(db):
+            engine.dispose()
+        db.engine.dispose()
+
+
+def bench(shard_count, rows, workers):
+    workdir = tempfile.mkdtemp()
+    template = f"sqlite:///{workdir}/shard{{}}.db"
+    config = {"SHARD_COUNT": shard_count, "SHARD_URL_TEMPLATE": template}
+    if shard_count > 1:
+        config["SQLALCHEMY_BINDS"] = {f"shard{i}": template.format(i) for i in range(shard_count)}
+    app = make_app(os.path.join(workdir, "main.db"), **config)
+    with app.app_context():
+        shards.create_all(db)
+    # Forked workers must open their own SQLite connections, not share the parent's pooled ones
+    dispose_engines(app)
+
+    def work(user_id, n):
+        with app.app_context():
+            shards.bind_user(user_id)
+            for _ in range(n):
+                db.session.add(MoodEntry(user_id=user_id, mood="good", note="bench"))
+                db.session.commit()
+
+    def run():
+        ctx = multiprocessing.get_context("fork")
+        procs = [ctx.Process(target=work, args=(user_id, rows // workers))
+                 for user_id in range(1, workers + 1)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+
+    seconds, _ = timed(run)
+    dispose_engines(app)
+    shutil.rmtree(workdir)
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--shards", default="1,2,4,8")
+    args = parser.parse_args()
+    rows = args.rows // args.workers * args.workers
+
+    for count in (int(n) for n in args.shards.split(",")):
+        report(f"{count} shard(s), commit per row", rows, bench(count, rows, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import json
+import queue
+import threading
+import time
+
+# ---------------- In-process event hub ----------------
+# Each open /api/events stream owns one bounded queue. Routes publish small
+# deltas (the same dicts the list endpoints return) once their commit has gone
+# through, so the React pages can patch local state instead of refetching.
+#
+# The hub lives in process memory: a stream only sees events published by the
+# worker that serves it. Every open stream holds one gunicorn thread, so a
+# worker accepts at most SSE_MAX_STREAMS of them and the Procfile gives it
+# more threads than that; the rest are left for normal requests.
+#
+# A stream ends with an "end" event when its token expires or when the
+# account is being deleted (checked at every heartbeat). The client then
+# closes it instead of reconnecting.
+
+SUBSCRIBER_QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 15
+
+
+class EventHub:
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = {}  # user_id -> set of queues
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if not queues:
+                return
+            queues.discard(q)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id, event, data):
+        with self._lock:
+            queues = list(self._subscribers.get(user_id, ()))
+        for q in queues:
+            try:
+                q.put_nowait((event, data))
+            except queue.Full:
+                # A stalled client fell too far behind: drop its backlog and
+                # tell it to reload the lists once it catches up.
+                _drain(q)
+                q.put_nowait(("resync", {}))
+
+    def subscriber_count(self, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscribers.get(user_id, ()))
+            return sum(len(qs) for qs in self._subscribers.values())
+
+
+def _drain(q):
+    try:
+        while True:
+            q.get_nowait()
+    except queue.Empty:
+        pass
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_events(hub, user_id, heartbeat=HEARTBEAT_SECONDS, expires_at=None, still_allowed=None):
+    """Yield SSE messages for one user until the client disconnects.
+
+    expires_at is the token's expiry (epoch seconds); still_allowed() is
+    called at each heartbeat and ends the stream when it returns False.
+    """
+    q = hub.subscribe(user_id)
+    try:
+        yield ": connected\n\n"
+        while True:
+            timeout = heartbeat
+            if expires_at is not None:
+                timeout = min(heartbeat, expires_at - time.time())
+                if timeout <= 0:
+                    yield format_sse("end", {"reason": "expired"})
+                    return
+            try:
+                event, data = q.get(timeout=timeout)
+            except queue.Empty:
+                if still_allowed is not None and not still_allowed():
+                    yield format_sse("end", {"reason": "revoked"})
+                    return
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event, data)
+    finally:
+        hub.unsubscribe(user_id, q)
+
+
+event_hub = EventHub()
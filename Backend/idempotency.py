@@ -0,0 +1,138 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+
+# ---------------- Idempotency keys ----------------
+# Mutating routes decorated with @idempotent honour an `Idempotency-Key`
+# header. The first response for (identity, method, path, key) is kept for
+# IDEMPOTENCY_TTL_SECONDS and replayed to retries without running the view,
+# so a retried POST /api/mood neither adds a second entry nor touches the
+# database. A retry that arrives while the first request is still running
+# waits for it instead of racing it. Reusing a key with a different body is
+# rejected with 422.
+#
+# The store is per process and bounded (oldest keys are evicted first). 5xx
+# responses aren't kept, so a retry after a server error runs again.
+
+KEY_MAX_LENGTH = 255
+REPLAY_HEADERS = ("Content-Type", "Location")
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "created", "done", "response")
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.created = time.monotonic()
+        self.done = threading.Event()
+        self.response = None  # (status, body, headers) once complete
+
+
+class IdempotencyStore:
+    def __init__(self, app=None):
+        self.ttl = 24 * 3600
+        self.max_keys = 10000
+        self.wait_timeout = 30.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("IDEMPOTENCY_TTL_SECONDS", 24 * 3600)
+        app.config.setdefault("IDEMPOTENCY_MAX_KEYS", 10000)
+        app.config.setdefault("IDEMPOTENCY_WAIT_SECONDS", 30.0)
+        self.ttl = app.config["IDEMPOTENCY_TTL_SECONDS"]
+        self.max_keys = app.config["IDEMPOTENCY_MAX_KEYS"]
+        self.wait_timeout = app.config["IDEMPOTENCY_WAIT_SECONDS"]
+
+    def begin(self, key, fingerprint):
+        """Return ("new" | "replay" | "wait" | "mismatch", entry)."""
+        with self._lock:
+            self._evict()
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(fingerprint)
+                return "new", entry
+            if entry.fingerprint != fingerprint:
+                return "mismatch", entry
+            return ("replay" if entry.done.is_set() else "wait"), entry
+
+    def complete(self, key, entry, response):
+        entry.response = response
+        entry.done.set()
+
+    def abandon(self, key, entry):
+        """Forget an in-flight key (the request failed) and release any waiters."""
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.done.set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        # Entries are in insertion order, so expired ones are at the front
+        cutoff = time.monotonic() - self.ttl
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.created >= cutoff and len(self._entries) < self.max_keys:
+                break
+            del self._entries[key]
+
+
+idempotency_store = IdempotencyStore()
+
+
+def idempotent(view):
+    """Replay the stored response for a repeated Idempotency-Key (use under @jwt_required)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = request.headers.get("Idempotency-Key")
+        if not token:
+            return view(*args, **kwargs)
+        if len(token) > KEY_MAX_LENGTH:
+            return jsonify({"error": "Idempotency-Key is too long"}), 400
+
+        store = idempotency_store
+        key = (get_jwt_identity() or "", request.method, request.path, token)
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        deadline = time.monotonic() + store.wait_timeout
+        while True:
+            state, entry = store.begin(key, fingerprint)
+            if state == "mismatch":
+                return jsonify({"error": "Idempotency-Key was already used with a different request"}), 422
+            if state == "replay" and entry.response is not None:
+                return _replay(entry.response)
+            if state == "new":
+                break
+            # Same request already in flight (or just abandoned): wait, then look again
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not entry.done.wait(remaining):
+                return jsonify({"error": "A request with this Idempotency-Key is still in progress"}), 409
+
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            store.abandon(key, entry)
+            raise
+        if response.status_code >= 500 or response.is_streamed:
+            store.abandon(key, entry)
+        else:
+            headers = {h: response.headers[h] for h in REPLAY_HEADERS if h in response.headers}
+            store.complete(key, entry, (response.status_code, response.get_data(), headers))
+        return response
+    return wrapper
+
+
+def _replay(stored):
+    status, body, headers = stored
+    response = current_app.response_class(body, status=status, headers=headers)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
@@ -0,0 +1,35 @@
+"""Add lookup indexes
+
+Revision ID: 3f9c2a7d1e45
+Revises: 628a356d5bf8
+Create Date: 2026-10-19 10:12:31.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a7d1e45'
+down_revision = '628a356d5bf8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Indexes reported missing by query_audit.py
+    op.create_index('ix_booking_therapist_day_slot', 'booking', ['therapist_id', 'day', 'slot'], unique=False)
+    op.create_index('ix_booking_user_id', 'booking', ['user_id'], unique=False)
+    op.create_index('ix_mood_entry_user_timestamp', 'mood_entry', ['user_id', 'timestamp'], unique=False)
+    op.create_index('ix_therapist_availability_therapist_day_slot', 'therapist_availability', ['therapist_id', 'day', 'slot'], unique=False)
+    op.create_index('ix_resource_created_at', 'resource', ['created_at'], unique=False)
+    op.create_index('ix_emergency_contact_user_id', 'emergency_contact', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_emergency_contact_user_id', table_name='emergency_contact')
+    op.drop_index('ix_resource_created_at', table_name='resource')
+    op.drop_index('ix_therapist_availability_therapist_day_slot', table_name='therapist_availability')
+    op.drop_index('ix_mood_entry_user_timestamp', table_name='mood_entry')
+    op.drop_index('ix_booking_user_id', table_name='booking')
+    op.drop_index('ix_booking_therapist_day_slot', table_name='booking')
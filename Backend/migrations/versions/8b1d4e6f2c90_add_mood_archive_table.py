@@ -0,0 +1,34 @@
+"""Add mood archive table
+
+Revision ID: 8b1d4e6f2c90
+Revises: 3f9c2a7d1e45
+Create Date: 2026-10-19 14:37:05.618230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1d4e6f2c90'
+down_revision = '3f9c2a7d1e45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('mood_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.String(length=7), nullable=False),
+    sa.Column('entry_count', sa.Integer(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'month', name='uq_mood_archive_user_month')
+    )
+
+
+def downgrade():
+    op.drop_table('mood_archive')
@@ -0,0 +1,39 @@
+"""Add purge job table
+
+Revision ID: c47e9a13b5d2
+Revises: 8b1d4e6f2c90
+Create Date: 2026-10-19 16:02:48.971342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47e9a13b5d2'
+down_revision = '8b1d4e6f2c90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('purge_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('current_table', sa.String(length=50), nullable=True),
+    sa.Column('deleted_rows', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('worker', sa.String(length=64), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_purge_job_user_id', 'purge_job', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_purge_job_user_id', table_name='purge_job')
+    op.drop_table('purge_job')
@@ -0,0 +1,43 @@
+"""Never reuse mood entry ids
+
+Archived entries keep their ids inside mood_archive rows, with no mood_entry
+row holding them, so mood_entry switches to AUTOINCREMENT and its sequence
+starts above the highest archived id.
+
+Revision ID: d5a2f81c3e67
+Revises: c47e9a13b5d2
+Create Date: 2026-10-19 18:02:41.530117
+
+"""
+import json
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a2f81c3e67'
+down_revision = 'c47e9a13b5d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('mood_entry', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+
+    conn = op.get_bind()
+    top = conn.execute(sa.text('SELECT COALESCE(MAX(id), 0) FROM mood_entry')).scalar()
+    for (data,) in conn.execute(sa.text('SELECT data FROM mood_archive')):
+        entries = json.loads(zlib.decompress(data).decode('utf-8'))
+        top = max([top] + [entry['id'] for entry in entries])
+    conn.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = 'mood_entry'"))
+    conn.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('mood_entry', :seq)"), {'seq': top})
+
+
+def downgrade():
+    with op.batch_alter_table('mood_entry', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+        pass
@@ -0,0 +1,44 @@
+"""Never reuse user ids; purge jobs forget the email when done
+
+Revision ID: e91b6d4a7f20
+Revises: d5a2f81c3e67
+Create Date: 2026-10-19 18:40:12.208845
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e91b6d4a7f20'
+down_revision = 'd5a2f81c3e67'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+
+    # Start above every id ever handed out, including those of purged accounts
+    conn = op.get_bind()
+    top = conn.execute(sa.text(
+        'SELECT MAX(id) FROM (SELECT MAX(id) AS id FROM user UNION ALL SELECT MAX(user_id) FROM purge_job)'
+    )).scalar() or 0
+    conn.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = 'user'"))
+    conn.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('user', :seq)"), {'seq': top})
+
+    with op.batch_alter_table('purge_job', schema=None) as batch_op:
+        batch_op.alter_column('email', existing_type=sa.String(length=120), nullable=True)
+    op.execute("UPDATE purge_job SET email = NULL WHERE status = 'done'")
+
+
+def downgrade():
+    op.execute("UPDATE purge_job SET email = '' WHERE email IS NULL")
+    with op.batch_alter_table('purge_job', schema=None) as batch_op:
+        batch_op.alter_column('email', existing_type=sa.String(length=120), nullable=False)
+
+    with op.batch_alter_table('user', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+        pass
@@ -0,0 +1,33 @@
+"""Never reuse resource ids
+
+Revision ID: f3b8c61d2a94
+Revises: e91b6d4a7f20
+Create Date: 2026-10-20 10:12:47.531906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8c61d2a94'
+down_revision = 'e91b6d4a7f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('resource', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+
+    conn = op.get_bind()
+    top = conn.execute(sa.text('SELECT MAX(id) FROM resource')).scalar() or 0
+    conn.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = 'resource'"))
+    conn.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('resource', :seq)"), {'seq': top})
+
+
+def downgrade():
+    with op.batch_alter_table('resource', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+        pass
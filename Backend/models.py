@@ -1,12 +1,17 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
-db = SQLAlchemy()
+from shards import ShardedSession
+
+db = SQLAlchemy(session_options={"class_": ShardedSession})
 
 # -----------------------
 # User Model
 # -----------------------
 class User(db.Model):
+    # Ids are never reused: purge jobs and stray tokens still refer to deleted users by id
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -24,6 +29,12 @@ class User(db.Model):
 # Mood Entry Model
 # -----------------------
 class MoodEntry(db.Model):
+    __table_args__ = (
+        db.Index("ix_mood_entry_user_timestamp", "user_id", "timestamp"),
+        # Archived entries keep their ids without a row here, so ids must never be reused
+        {"sqlite_autoincrement": True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -34,6 +45,26 @@ class MoodEntry(db.Model):
         return f"<MoodEntry User:{self.user_id} @ {self.timestamp} - Mood: {self.mood}>"
 
 
+# -----------------------
+# Mood Archive Model
+# -----------------------
+class MoodArchive(db.Model):
+    """One user's mood entries for one past month, zlib-compressed JSON (see mood_archive.py)."""
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "month", name="uq_mood_archive_user_month"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # e.g. "2024-03"
+    entry_count = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<MoodArchive User:{self.user_id} {self.month} ({self.entry_count} entries)>"
+
+
 # -----------------------
 # Therapist Model
 # -----------------------
@@ -58,6 +89,10 @@ class Therapist(db.Model):
 # Therapist Availability Model
 # -----------------------
 class TherapistAvailability(db.Model):
+    __table_args__ = (
+        db.Index("ix_therapist_availability_therapist_day_slot", "therapist_id", "day", "slot"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     therapist_id = db.Column(db.Integer, db.ForeignKey("therapist.id"), nullable=False)
     day = db.Column(db.String(20), nullable=False)  # e.g. "Monday"
@@ -71,8 +106,12 @@ class TherapistAvailability(db.Model):
 # Booking Model
 # -----------------------
 class Booking(db.Model):
+    __table_args__ = (
+        db.Index("ix_booking_therapist_day_slot", "therapist_id", "day", "slot"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
     therapist_id = db.Column(db.Integer, db.ForeignKey("therapist.id"), nullable=False)
     day = db.Column(db.String(20), nullable=False)
     slot = db.Column(db.String(10), nullable=False)
@@ -86,6 +125,9 @@ class Booking(db.Model):
 # Resource Model
 # -----------------------
 class Resource(db.Model):
+    # Ids are never reused, so the recommender can tell new resources from old
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(300), nullable=False)
     summary = db.Column(db.Text)
@@ -95,7 +137,7 @@ class Resource(db.Model):
     tags = db.Column(db.String(300))  # comma separated
     published_at = db.Column(db.DateTime, nullable=True)
     verified = db.Column(db.Boolean, default=False)  # admin flag
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     def to_dict(self):
         return {
@@ -112,7 +154,7 @@ class Resource(db.Model):
 
 class EmergencyContact(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20), nullable=False)
     email = db.Column(db.String(120), nullable=True)
@@ -121,3 +163,34 @@ class EmergencyContact(db.Model):
     def __repr__(self):
         return f"<EmergencyContact {self.name} ({self.relationship})>"
 
+
+# -----------------------
+# Account Purge Job Model
+# -----------------------
+class PurgeJob(db.Model):
+    """Background deletion of one user's account and data (see purge.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    email = db.Column(db.String(120), nullable=True)  # cleared once the account is gone
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued, running, done, failed
+    current_table = db.Column(db.String(50), nullable=True)
+    deleted_rows = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    worker = db.Column(db.String(64), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)  # worker heartbeat
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "current_table": self.current_table,
+            "deleted_rows": self.deleted_rows,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f"<PurgeJob {self.id} User:{self.user_id} {self.status}>"
@@ -0,0 +1,267 @@
+import json
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+
+import shards
+from models import db, MoodEntry, MoodArchive
+
+# ---------------- Hot/cold mood storage ----------------
+# mood_entry (hot) keeps recent check-ins. `flask moods archive` moves whole
+# months older than --older-than-days into mood_archive (cold): one row per
+# user per month holding the entries as zlib-compressed JSON. Entries keep
+# their ids, so the API can still find, edit and delete them. mood_entry ids
+# are AUTOINCREMENT so a new check-in never takes an archived id, and shard
+# rebalance gives moved archive entries fresh ids on their new shard.
+#
+# load_moods() reads both tiers. Archived months are only decompressed when the
+# requested range reaches them; GET /api/moods without a range skips them.
+#
+# Edits of archived entries and the archival job rewrite a whole month's blob,
+# so both read and write inside one BEGIN IMMEDIATE transaction: SQLite hands
+# out its write lock before the read, and two edits of the same month (or an
+# edit racing the archival of that month) can't overwrite each other.
+
+ARCHIVE_AFTER_DAYS = 365
+
+
+def month_key(ts):
+    return ts.strftime("%Y-%m")
+
+
+def month_start(ts):
+    return datetime(ts.year, ts.month, 1)
+
+
+def next_month(ts):
+    return datetime(ts.year + ts.month // 12, ts.month % 12 + 1, 1)
+
+
+def pack(entries):
+    """Compress a list of mood dicts (as returned by the API)."""
+    return zlib.compress(json.dumps(entries, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def unpack(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def entry_to_dict(entry):
+    return {
+        "id": entry.id,
+        "timestamp": entry.timestamp.isoformat() if entry.timestamp else None,
+        "mood": entry.mood,
+        "note": entry.note,
+    }
+
+
+def load_moods(user_id, start=None, end=None, archived=True):
+    """Mood dicts for user_id with start <= timestamp < end, newest first.
+
+    archived=False reads the hot table only.
+    """
+    hot = MoodEntry.query.filter_by(user_id=user_id)
+    if start:
+        hot = hot.filter(MoodEntry.timestamp >= start)
+    if end:
+        hot = hot.filter(MoodEntry.timestamp < end)
+    result = [entry_to_dict(m) for m in hot.order_by(MoodEntry.timestamp.desc()).all()]
+    if not archived:
+        return result
+
+    cold = MoodArchive.query.filter_by(user_id=user_id)
+    if start:
+        cold = cold.filter(MoodArchive.month >= month_key(start))
+    if end:
+        cold = cold.filter(MoodArchive.month <= month_key(end - timedelta(microseconds=1)))
+    archived = []
+    for archive in cold.all():
+        for entry in unpack(archive.data):
+            ts = entry["timestamp"]
+            if (start and ts < start.isoformat()) or (end and ts >= end.isoformat()):
+                continue
+            archived.append(entry)
+    if archived:
+        result.extend(archived)
+        result.sort(key=lambda e: e["timestamp"] or "", reverse=True)
+    return result
+
+
+def max_archived_id(conn):
+    """Highest mood entry id kept in this database's archive rows."""
+    top = 0
+    for data in conn.execute(sa.select(MoodArchive.__table__.c.data)).scalars():
+        top = max([top] + [entry["id"] for entry in unpack(data)])
+    return top
+
+
+def remap_archived_ids(conn, rows):
+    """Give the entries of archive rows that rebalance moves fresh ids on the target shard.
+
+    Their old ids belong to the source's mood_entry sequence and could clash
+    with entries already on the target.
+    """
+    remapped = []
+    for row in rows:
+        entries = unpack(row["data"])
+        for entry, new_id in zip(entries, shards.reserve_ids(conn, MoodEntry.__table__, len(entries))):
+            entry["id"] = new_id
+        remapped.append({**row, "data": pack(entries)})
+    return remapped
+
+
+shards.copy_hooks.setdefault("mood_archive", []).append(remap_archived_ids)
+shards.id_floor_hooks.setdefault("mood_entry", []).append(max_archived_id)
+
+
+@contextmanager
+def write_transaction(engine):
+    """A connection whose transaction holds SQLite's write lock from the start."""
+    with engine.connect() as conn:
+        # pysqlite would only BEGIN (deferred) at the first write, after our reads
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def modify_archived(user_id, entry_id, change):
+    """Apply change(entry) -> entry or None (delete) to an archived entry.
+
+    Returns the updated dict, {} if it was deleted, or None if not archived.
+    Scans the user's archive rows, which is fine for one row per month.
+    """
+    cold = MoodArchive.__table__
+    with write_transaction(shards.engine_for_user(db, user_id)) as conn:
+        archives = conn.execute(sa.select(cold.c.id, cold.c.data).where(cold.c.user_id == user_id)).all()
+        for archive in archives:
+            entries = unpack(archive.data)
+            for i, entry in enumerate(entries):
+                if entry["id"] != entry_id:
+                    continue
+                updated = change(dict(entry))
+                if updated is None:
+                    del entries[i]
+                else:
+                    entries[i] = updated
+                if entries:
+                    conn.execute(cold.update().where(cold.c.id == archive.id).values(
+                        data=pack(entries), entry_count=len(entries)))
+                else:
+                    conn.execute(cold.delete().where(cold.c.id == archive.id))
+                return updated if updated is not None else {}
+    return None
+
+
+# ---------------- Archival job ----------------
+def archive_engine(engine, cutoff):
+    """Move whole months before `cutoff` from mood_entry into mood_archive on one database.
+
+    Each (user, month) moves in its own short write-locked transaction.
+    """
+    hot, cold = MoodEntry.__table__, MoodArchive.__table__
+    stats = {"rows": 0, "months": 0}
+    month_expr = sa.func.strftime("%Y-%m", hot.c.timestamp)
+    with engine.connect() as conn:
+        groups = conn.execute(
+            sa.select(hot.c.user_id, month_expr.label("month"))
+            .where(hot.c.timestamp < cutoff)
+            .group_by(hot.c.user_id, month_expr)).all()
+
+    for user_id, month in groups:
+        start = datetime.strptime(month, "%Y-%m")
+        with write_transaction(engine) as conn:
+            rows = conn.execute(
+                sa.select(hot).where(hot.c.user_id == user_id,
+                                     hot.c.timestamp >= start, hot.c.timestamp < next_month(start))
+                .order_by(hot.c.timestamp)).all()
+            if not rows:
+                continue
+            moved = [entry_to_dict(r) for r in rows]
+            existing = conn.execute(
+                sa.select(cold.c.id, cold.c.data)
+                .where(cold.c.user_id == user_id, cold.c.month == month)).first()
+            entries = (unpack(existing.data) if existing else []) + moved
+            entries.sort(key=lambda e: e["timestamp"] or "")
+            data = pack(entries)
+            if existing:
+                conn.execute(cold.update().where(cold.c.id == existing.id).values(
+                    data=data, entry_count=len(entries), archived_at=datetime.utcnow()))
+            else:
+                conn.execute(cold.insert().values(
+                    user_id=user_id, month=month, data=data, entry_count=len(entries),
+                    archived_at=datetime.utcnow()))
+            conn.execute(hot.delete().where(hot.c.id.in_([r.id for r in rows])))
+
+        stats["rows"] += len(rows)
+        stats["months"] += 1
+    return stats
+
+
+def used_bytes(engine):
+    """Bytes of the database file in use (free pages excluded)."""
+    with engine.connect() as conn:
+        page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+        pages = conn.exec_driver_sql("PRAGMA page_count").scalar()
+        free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    return (pages - free) * page_size
+
+
+def hot_query_latency(engine, user_ids, repeat=5):
+    """Average ms for the get_moods hot-table query over the given users."""
+    if not user_ids:
+        return 0.0
+    hot = MoodEntry.__table__
+    stmt = sa.select(hot).where(hot.c.user_id == sa.bindparam("uid")).order_by(hot.c.timestamp.desc())
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for uid in user_ids:
+                conn.execute(stmt, {"uid": uid}).all()
+        elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(user_ids)) * 1000
+
+
+moods_cli = AppGroup("moods", help="Mood journal maintenance.")
+
+
+@moods_cli.command("archive")
+@click.option("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS, show_default=True,
+              help="Archive whole months that ended more than this many days ago.")
+def archive_command(older_than_days):
+    """Move old mood entries into compressed per-user monthly archives."""
+    cutoff = month_start(datetime.utcnow() - timedelta(days=older_than_days))
+    total = {"rows": 0, "months": 0}
+    before = after = 0.0
+    size_before = size_after = 0
+    engines = shards.shard_engines(db)
+    for engine in engines:
+        with engine.connect() as conn:
+            sample = conn.execute(sa.select(MoodEntry.__table__.c.user_id)
+                                  .where(MoodEntry.__table__.c.timestamp < cutoff)
+                                  .distinct().limit(20)).scalars().all()
+        before += hot_query_latency(engine, sample)
+        size_before += used_bytes(engine)
+        stats = archive_engine(engine, cutoff)
+        size_after += used_bytes(engine)
+        after += hot_query_latency(engine, sample)
+        for key in total:
+            total[key] += stats[key]
+
+    click.echo(f"Archived {total['rows']} entries into {total['months']} user-month(s) before {cutoff:%Y-%m}")
+    if total["rows"]:
+        change = 100 * (size_after - size_before) / size_before
+        click.echo(f"Database pages in use: {size_before / 1024:.0f} KiB -> {size_after / 1024:.0f} KiB "
+                   f"({change:+.0f}%)")
+        if size_after < size_before:
+            click.echo("Run VACUUM to return the freed pages to the filesystem")
+        click.echo(f"Hot-table get_moods query: {before / len(engines):.2f} ms -> "
+                   f"{after / len(engines):.2f} ms per user")
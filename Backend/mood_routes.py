@@ -1,68 +1,144 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, MoodEntry
+import os
+import threading
+import time
+from datetime import timedelta
+
+from flask import Blueprint, Flask, current_app, request, jsonify
+from flask_cors import CORS
+from flask_jwt_extended import JWTManager, jwt_required, get_jwt
+
+import purge
+import shards
+from admission import admission, parse_limit, DEFAULT_LIMITS
+from models import db
+from write_behind import mood_writer, WriterBusy, InvalidMood
+from idempotency import idempotency_store, idempotent
+
+# ---------------- Standalone mood ingest ----------------
+# POST /api/mood as its own small WSGI app, so check-ins can be scaled and
+# deployed apart from the main API:
+#   gunicorn --worker-class gthread --threads 16 'mood_routes:create_app()'
+# It imports only Flask, flask_jwt_extended, flask_cors and the models, never
+# myapp (no bcrypt, requests, numpy or the other routes). The same per-user
+# rate limits and write cap as myapp apply (see admission.py).
+#
+# Requests don't look the user up. The JWT is checked with the shared
+# JWT_SECRET_KEY, and the user id comes from the token's "uid" claim, which
+# login adds. A user whose account is being deleted (or is gone) still holds
+# a valid token for up to an hour, so:
+#   - requests are refused with 403 when the id is in a deny list of purge
+#     jobs (active, or finished within a token lifetime), reloaded every
+#     INGEST_DENY_REFRESH_SECONDS
+#   - the write-behind writer checks purge jobs again for every batch, so
+#     nothing is written for such a user in between reloads either
+# User ids are never reused, so a stale token can't write into someone else's
+# journal. Rows always go through the write-behind queue.
+#
+# Because it runs in another process, SSE clients of the main app don't get
+# "mood.created" for entries written here; they see them on the next fetch.
+
+
+class DeletedAccounts:
+    """Cached ids of users whose account is being or has been deleted."""
+
+    def __init__(self):
+        self._ids = frozenset()
+        self._loaded = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, user_id):
+        if self._stale():
+            with self._lock:
+                if self._stale():
+                    self._ids = frozenset(purge.users_being_deleted(db.engine))
+                    self._loaded = time.monotonic()
+        return user_id in self._ids
+
+    def _stale(self):
+        interval = current_app.config["INGEST_DENY_REFRESH_SECONDS"]
+        return self._loaded is None or time.monotonic() - self._loaded >= interval
+
+
+deleted_accounts = DeletedAccounts()
 
 mood_bp = Blueprint('mood_bp', __name__)
 
-# POST: Add new mood entry
+
 @mood_bp.route('/api/mood', methods=['POST'])
 @jwt_required()
+@idempotent
 def add_mood():
-    user_email = get_jwt_identity()
-    data = request.get_json()
+    user_id = get_jwt().get('uid')
+    if user_id is None:
+        return jsonify({'error': 'Token has no user id, please log in again'}), 401
+    if user_id in deleted_accounts:
+        return jsonify({'error': 'This account is being deleted'}), 403
 
+    data = request.get_json(silent=True) or {}
     mood = data.get('mood')
-    note = data.get('note')
+    note = data.get('note', '')
 
     if not mood or not isinstance(mood, str) or not mood.strip():
-        return jsonify({'msg': 'Mood is required and must be a non-empty string'}), 400
+        return jsonify({'error': 'Mood is required'}), 400
 
     try:
-        entry = MoodEntry(user_email=user_email, mood=mood.strip(), note=note)
-        db.session.add(entry)
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'msg': 'Failed to save mood entry', 'error': str(e)}), 500
+        pending = mood_writer.submit(user_id, mood.strip(), note)
+    except InvalidMood as e:
+        return jsonify({'error': str(e)}), 400
+    except WriterBusy:
+        return jsonify({'error': 'Too many pending mood entries, try again shortly'}), 503
+    if not mood_writer.strict:
+        return jsonify({'message': 'Mood entry queued'}), 202
+    try:
+        entry_id = pending.wait(current_app.config['MOOD_ACK_TIMEOUT'])
+    except TimeoutError:
+        # Still queued and may commit later; don't invite a duplicate retry
+        return jsonify({'message': 'Mood entry queued'}), 202
+    except purge.AccountDeleted:
+        return jsonify({'error': 'This account is being deleted'}), 403
+    except Exception:
+        current_app.logger.exception("Queued mood entry was not saved")
+        return jsonify({'error': 'Failed to save mood entry'}), 500
+    return jsonify({'message': 'Mood entry saved', 'id': entry_id}), 201
 
-    return jsonify({'msg': 'Mood entry saved'}), 201
 
-# GET: Fetch all mood entries for the user
-@mood_bp.route('/api/moods', methods=['GET'])
-@jwt_required()
-def get_moods():
-    user_email = get_jwt_identity()
-    try:
-        entries = MoodEntry.query.filter_by(user_email=user_email).order_by(MoodEntry.timestamp.desc()).all()
-    except Exception as e:
-        return jsonify({'msg': 'Failed to fetch mood entries', 'error': str(e)}), 500
-
-    result = [
-        {
-            'id': e.id,
-            'timestamp': e.timestamp.isoformat(),
-            'mood': e.mood,
-            'note': e.note
-        }
-        for e in entries
-    ]
-    return jsonify(result), 200
-
-# DELETE: Delete a mood entry by ID
-@mood_bp.route('/api/mood/<int:entry_id>', methods=['DELETE'])
-@jwt_required()
-def delete_mood(entry_id):
-    user_email = get_jwt_identity()
-    
-    entry = MoodEntry.query.filter_by(id=entry_id, user_email=user_email).first()
-    
-    if not entry:
-        return jsonify({'msg': 'Mood entry not found or not authorized'}), 404
+@mood_bp.route('/api/admission/metrics', methods=['GET'])
+def admission_metrics():
+    """Rate-limit counters for this worker process"""
+    return jsonify(admission.metrics()), 200
 
-    try:
-        db.session.delete(entry)
-        db.session.commit()
-        return jsonify({'msg': 'Mood entry deleted'}), 200
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'msg': 'Failed to delete mood entry', 'error': str(e)}), 500
+
+def create_app(config=None):
+    """The ingest app; settings come from the same env vars as myapp."""
+    app = Flask(__name__)
+    basedir = os.path.abspath(os.path.dirname(__file__))
+    app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'super-secret-key-change-this')
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'DATABASE_URL', f"sqlite:///{os.path.join(basedir, 'users.db')}")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['MOOD_WRITE_BEHIND'] = True
+    app.config['MOOD_WRITE_ACK'] = os.environ.get('MOOD_WRITE_ACK', 'strict')  # "strict" or "queued"
+    app.config['MOOD_FLUSH_INTERVAL_MS'] = int(os.environ.get('MOOD_FLUSH_INTERVAL_MS', 0))
+    app.config['MOOD_FLUSH_MAX_ROWS'] = int(os.environ.get('MOOD_FLUSH_MAX_ROWS', 200))
+    app.config['INGEST_DENY_REFRESH_SECONDS'] = float(os.environ.get('INGEST_DENY_REFRESH_SECONDS', 5))
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+    app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'local')  # "local" or "shared"
+    app.config['RATE_LIMITS'] = {name: parse_limit(os.environ.get(f'RATE_LIMIT_{name.upper()}'), default)
+                                 for name, default in DEFAULT_LIMITS.items()}
+    app.config['RATE_LIMIT_MAX_WRITES'] = int(os.environ.get('RATE_LIMIT_MAX_WRITES', 8))
+    app.config['RATE_LIMIT_WRITE_QUEUE_MS'] = int(os.environ.get('RATE_LIMIT_WRITE_QUEUE_MS', 100))
+    app.config['TRUSTED_PROXY_COUNT'] = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+    app.config.update(config or {})
+
+    shards.configure(app, int(app.config.get('SHARD_COUNT', os.environ.get('SHARD_COUNT', 1))),
+                     app.config.get('SHARD_URL_TEMPLATE', os.environ.get(
+                         'SHARD_URL_TEMPLATE', f'sqlite:///{basedir}/users_shard{{}}.db')))
+    db.init_app(app)
+    CORS(app)
+    JWTManager(app)
+    admission.init_app(app)
+    mood_writer.init_app(app)
+    idempotency_store.init_app(app)
+    app.register_blueprint(mood_bp)
+    return app
@@ -1,7 +1,7 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from datetime import datetime, timedelta
@@ -10,7 +10,16 @@ import requests  # For external API calls
 import logging
 
 # Models (including Resource and EmergencyContact)
-from models import db, User, MoodEntry, Therapist, TherapistAvailability, Booking, Resource, EmergencyContact
+from models import db, User, MoodEntry, Therapist, TherapistAvailability, Booking, Resource, EmergencyContact, PurgeJob
+from events import event_hub, stream_events
+from write_behind import mood_writer, WriterBusy, InvalidMood
+import shards
+from recommendations import recommender, RECENT_MOODS
+from semantic_search import semantic_search, search_cli, SearchUnavailable
+import mood_archive
+import purge
+from idempotency import idempotency_store, idempotent
+from admission import admission, parse_limit, DEFAULT_LIMITS
 
 # ---------------- App setup ----------------
 app = Flask(__name__, static_folder='client/build', static_url_path='/')
@@ -18,18 +27,62 @@ CORS(app)
 bcrypt = Bcrypt(app)
 
 # JWT config
-app.config['JWT_SECRET_KEY'] = 'super-secret-key-change-this'  # Change this in production!
+app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'super-secret-key-change-this')  # Change this in production!
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
 jwt = JWTManager(app)
 
 # DB config
 basedir = os.path.abspath(os.path.dirname(__file__))
 db_path = os.path.join(basedir, 'users.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f'sqlite:///{db_path}')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Per-user tables can be split across SHARD_COUNT files; see shards.py
+shards.configure(app, int(os.environ.get('SHARD_COUNT', 1)),
+                 os.environ.get('SHARD_URL_TEMPLATE', f'sqlite:///{basedir}/users_shard{{}}.db'))
+
 db.init_app(app)
 migrate = Migrate(app, db)
 
+# Mood write-behind (group commits), off by default; see write_behind.py
+app.config['MOOD_WRITE_BEHIND'] = os.environ.get('MOOD_WRITE_BEHIND', '0') == '1'
+app.config['MOOD_WRITE_ACK'] = os.environ.get('MOOD_WRITE_ACK', 'strict')  # "strict" or "queued"
+app.config['MOOD_FLUSH_INTERVAL_MS'] = int(os.environ.get('MOOD_FLUSH_INTERVAL_MS', 0))
+app.config['MOOD_FLUSH_MAX_ROWS'] = int(os.environ.get('MOOD_FLUSH_MAX_ROWS', 200))
+mood_writer.init_app(app)
+
+# GET /api/moods without from/to returns this many days from the hot table only
+app.config['MOOD_HISTORY_DAYS'] = int(os.environ.get('MOOD_HISTORY_DAYS', mood_archive.ARCHIVE_AFTER_DAYS))
+
+# Offline-built embedding index for /api/resources/semantic; see semantic_search.py
+app.config['SEMANTIC_INDEX_PREFIX'] = os.environ.get(
+    'SEMANTIC_INDEX_PREFIX', os.path.join(basedir, 'resource_embeddings'))
+semantic_search.init_app(app)
+
+# Background account deletion; PURGE_WORKER=0 when `flask purge run` runs separately
+app.config['PURGE_WORKER'] = os.environ.get('PURGE_WORKER', '1') == '1'
+purge.purge_worker.init_app(app)
+
+# Open /api/events streams per worker; keep below the gunicorn thread count (Procfile)
+app.config['SSE_MAX_STREAMS'] = int(os.environ.get('SSE_MAX_STREAMS', 16))
+
+# Replays for retried mutating requests; see idempotency.py
+idempotency_store.init_app(app)
+
+# Per-user rate limits and write concurrency cap; see admission.py
+app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'local')  # "local" or "shared"
+app.config['RATE_LIMITS'] = {name: parse_limit(os.environ.get(f'RATE_LIMIT_{name.upper()}'), default)
+                             for name, default in DEFAULT_LIMITS.items()}  # e.g. RATE_LIMIT_WRITE=5/10
+app.config['RATE_LIMIT_MAX_WRITES'] = int(os.environ.get('RATE_LIMIT_MAX_WRITES', 8))
+app.config['RATE_LIMIT_WRITE_QUEUE_MS'] = int(os.environ.get('RATE_LIMIT_WRITE_QUEUE_MS', 100))
+app.config['TRUSTED_PROXY_COUNT'] = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))  # proxies setting X-Forwarded-For
+admission.init_app(app)
+
+@app.before_request
+def start_background_workers():
+    purge.purge_worker.ensure_started()
+
 # Logging basic
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -69,9 +122,29 @@ def get_therapists():
         })
     return jsonify(result)
 
+# ---------------- Serializers ----------------
+def booking_to_dict(booking, therapist_name):
+    return {
+        "id": booking.id,
+        "therapist": therapist_name,
+        "day": booking.day,
+        "slot": booking.slot,
+        "created_at": booking.created_at.isoformat() if booking.created_at else None,
+        "therapist_id": booking.therapist_id
+    }
+
+def mood_to_dict(mood):
+    return {
+        'id': mood.id,
+        'timestamp': mood.timestamp.isoformat() if mood.timestamp else None,
+        'mood': mood.mood,
+        'note': mood.note
+    }
+
 # ---------------- Booking APIs ----------------
 @app.route('/api/bookings', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_booking():
     data = request.json
     therapist_id = data.get('therapistId')
@@ -85,6 +158,7 @@ def create_booking():
     user = User.query.filter_by(email=user_email).first()
     if not user:
         return jsonify({"error": "User not found"}), 404
+    shards.bind_user(user.id)
 
     therapist = Therapist.query.get(therapist_id)
     if not therapist:
@@ -95,14 +169,16 @@ def create_booking():
     if not availability:
         return jsonify({"error": "Selected slot not available"}), 400
 
-    existing_booking = Booking.query.filter_by(
-        therapist_id=therapist_id, day=day, slot=slot).first()
+    # Other users' bookings may live on other shards, so check all of them
+    existing_booking = shards.query_all_shards(db, db.select(Booking.id).filter_by(
+        therapist_id=therapist_id, day=day, slot=slot).limit(1))
     if existing_booking:
         return jsonify({"error": "Selected slot already booked"}), 409
 
     booking = Booking(user_id=user.id, therapist_id=therapist_id, day=day, slot=slot)
     db.session.add(booking)
     db.session.commit()
+    event_hub.publish(user.id, "booking.created", booking_to_dict(booking, therapist.name))
 
     return jsonify({"message": "Booking successful", "booking": {
         "id": booking.id,
@@ -118,28 +194,24 @@ def get_user_bookings():
     user = User.query.filter_by(email=user_email).first()
     if not user:
         return jsonify({"error": "User not found"}), 404
+    shards.bind_user(user.id)
 
     bookings = Booking.query.filter_by(user_id=user.id).all()
     data = []
     for b in bookings:
         therapist = Therapist.query.get(b.therapist_id)
-        data.append({
-            "id": b.id,
-            "therapist": therapist.name if therapist else "Unknown",
-            "day": b.day,
-            "slot": b.slot,
-            "created_at": b.created_at.isoformat() if b.created_at else None,
-            "therapist_id": b.therapist_id
-        })
+        data.append(booking_to_dict(b, therapist.name if therapist else "Unknown"))
     return jsonify(data)
 
 @app.route('/api/bookings/<int:booking_id>', methods=['DELETE'])
 @jwt_required()
+@idempotent
 def delete_booking(booking_id):
     user_email = get_jwt_identity()
     user = User.query.filter_by(email=user_email).first()
     if not user:
         return jsonify({"error": "User not found"}), 404
+    shards.bind_user(user.id)
 
     booking = Booking.query.get(booking_id)
     if not booking or booking.user_id != user.id:
@@ -147,10 +219,12 @@ def delete_booking(booking_id):
 
     db.session.delete(booking)
     db.session.commit()
+    event_hub.publish(user.id, "booking.deleted", {"id": booking_id})
     return jsonify({"message": "Booking cancelled successfully"}), 200
 
 @app.route('/api/bookings/<int:booking_id>', methods=['PUT'])
 @jwt_required()
+@idempotent
 def update_booking(booking_id):
     data = request.json
     day = data.get('day')
@@ -163,6 +237,7 @@ def update_booking(booking_id):
     user = User.query.filter_by(email=user_email).first()
     if not user:
         return jsonify({"error": "User not found"}), 404
+    shards.bind_user(user.id)
 
     booking = Booking.query.get(booking_id)
     if not booking or booking.user_id != user.id:
@@ -173,25 +248,30 @@ def update_booking(booking_id):
     if not availability:
         return jsonify({"error": "Selected slot not available"}), 400
 
-    existing_booking = Booking.query.filter_by(
-        therapist_id=booking.therapist_id, day=day, slot=slot).first()
-    if existing_booking and existing_booking.id != booking_id:
+    existing_bookings = shards.query_all_shards(db, db.select(Booking.id, Booking.user_id).filter_by(
+        therapist_id=booking.therapist_id, day=day, slot=slot))
+    if any((b.id, b.user_id) != (booking.id, booking.user_id) for b in existing_bookings):
         return jsonify({"error": "Selected slot already booked"}), 409
 
     booking.day = day
     booking.slot = slot
     db.session.commit()
+    therapist = Therapist.query.get(booking.therapist_id)
+    event_hub.publish(user.id, "booking.updated",
+                      booking_to_dict(booking, therapist.name if therapist else "Unknown"))
 
     return jsonify({"message": "Booking updated successfully"}), 200
 
 # ---------------- Mood Entry APIs ----------------
 @app.route('/api/mood', methods=['POST'])
 @jwt_required()
+@idempotent
 def add_mood():
     user_email = get_jwt_identity()
     user = User.query.filter_by(email=user_email).first()
     if not user:
         return jsonify({"error": "User not found"}), 404
+    shards.bind_user(user.id)
 
     data = request.get_json()
     mood = data.get('mood')
@@ -200,9 +280,34 @@ def add_mood():
     if not mood:
         return jsonify({'error': 'Mood is required'}), 400
 
+    if mood_writer.enabled:
+        try:
+            pending = mood_writer.submit(user.id, mood, note)
+        except InvalidMood as e:
+            return jsonify({'error': str(e)}), 400
+        except WriterBusy:
+            return jsonify({'error': 'Too many pending mood entries, try again shortly'}), 503
+        if not mood_writer.strict:
+            return jsonify({'message': 'Mood entry queued'}), 202
+        # Give our pooled connection back while waiting, or enough waiting
+        # requests leave the writer thread no connection to flush with
+        db.session.close()
+        try:
+            pending.wait(app.config['MOOD_ACK_TIMEOUT'])
+        except TimeoutError:
+            # Still queued and may commit later; don't invite a duplicate retry
+            return jsonify({'message': 'Mood entry queued'}), 202
+        except purge.AccountDeleted:
+            return jsonify({'error': 'This account is being deleted'}), 403
+        except Exception:
+            logger.exception("Queued mood entry was not saved")
+            return jsonify({'error': 'Failed to save mood entry'}), 500
+        return jsonify({'message': 'Mood entry saved'}), 201
+
     entry = MoodEntry(user_id=user.id, mood=mood, note=note)
     db.session.add(entry)
     db.session.commit()
+    event_hub.publish(user.id, "mood.created", mood_to_dict(entry))
 
     return jsonify({'message': 'Mood entry saved'}), 201
 
@@ -213,58 +318,125 @@ def get_moods():
     user = User.query.filter_by(email=user_email).first()
     if not user:
         return jsonify([]), 200
-
-    moods = MoodEntry.query.filter_by(user_id=user.id).order_by(MoodEntry.timestamp.desc()).all()
-
-    result = [{
-        'id': mood.id,
-        'timestamp': mood.timestamp.isoformat() if mood.timestamp else None,
-        'mood': mood.mood,
-        'note': mood.note
-    } for mood in moods]
-
-    return jsonify(result), 200
+    shards.bind_user(user.id)
+
+    # Optional ?from=YYYY-MM-DD&to=YYYY-MM-DD (inclusive); archived months are
+    # only read when the range reaches them. Without either, the last
+    # MOOD_HISTORY_DAYS of hot entries, so a page load never unpacks the archive.
+    if not request.args.get('from') and not request.args.get('to'):
+        start = datetime.utcnow() - timedelta(days=app.config['MOOD_HISTORY_DAYS'])
+        return jsonify(mood_archive.load_moods(user.id, start, archived=False)), 200
+    try:
+        start = datetime.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end = datetime.fromisoformat(request.args['to']) + timedelta(days=1) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO dates'}), 400
+
+    return jsonify(mood_archive.load_moods(user.id, start, end)), 200
 
 @app.route('/api/mood/<int:mood_id>', methods=['DELETE'])
 @jwt_required()
+@idempotent
 def delete_mood(mood_id):
     user_email = get_jwt_identity()
     user = User.query.filter_by(email=user_email).first()
     if not user:
         return jsonify({'error': 'User not found'}), 404
+    shards.bind_user(user.id)
 
     mood_entry = MoodEntry.query.get(mood_id)
     if not mood_entry or mood_entry.user_id != user.id:
-        return jsonify({'error': 'Mood entry not found or access denied'}), 404
+        if mood_archive.modify_archived(user.id, mood_id, lambda entry: None) is None:
+            return jsonify({'error': 'Mood entry not found or access denied'}), 404
+        event_hub.publish(user.id, "mood.deleted", {'id': mood_id})
+        return jsonify({'message': 'Mood entry deleted'}), 200
 
     db.session.delete(mood_entry)
     db.session.commit()
+    event_hub.publish(user.id, "mood.deleted", {'id': mood_id})
     return jsonify({'message': 'Mood entry deleted'}), 200
 
 @app.route('/api/mood/<int:mood_id>', methods=['PUT'])
 @jwt_required()
+@idempotent
 def update_mood(mood_id):
     user_email = get_jwt_identity()
     user = User.query.filter_by(email=user_email).first()
     if not user:
         return jsonify({'error': 'User not found'}), 404
-
-    mood_entry = MoodEntry.query.get(mood_id)
-    if not mood_entry or mood_entry.user_id != user.id:
-        return jsonify({'error': 'Mood entry not found or access denied'}), 404
+    shards.bind_user(user.id)
 
     data = request.get_json()
     mood = data.get('mood')
     note = data.get('note')
 
+    mood_entry = MoodEntry.query.get(mood_id)
+    if not mood_entry or mood_entry.user_id != user.id:
+        def change(entry):
+            if mood:
+                entry['mood'] = mood
+            if note is not None:
+                entry['note'] = note
+            return entry
+
+        updated = mood_archive.modify_archived(user.id, mood_id, change)
+        if updated is None:
+            return jsonify({'error': 'Mood entry not found or access denied'}), 404
+        event_hub.publish(user.id, "mood.updated", updated)
+        return jsonify({'message': 'Mood entry updated'}), 200
+
     if mood:
         mood_entry.mood = mood
     if note is not None:
         mood_entry.note = note
 
     db.session.commit()
+    event_hub.publish(user.id, "mood.updated", mood_to_dict(mood_entry))
     return jsonify({'message': 'Mood entry updated'}), 200
 
+@mood_writer.on_commit
+def publish_queued_mood(row):
+    event_hub.publish(row['user_id'], "mood.created", {
+        'id': row['id'],
+        'timestamp': row['timestamp'].isoformat(),
+        'mood': row['mood'],
+        'note': row['note']
+    })
+
+# ---------------- Live Updates (SSE) ----------------
+@app.route('/api/events', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])  # EventSource can't set headers, so ?jwt= is allowed here
+def events():
+    user_email = get_jwt_identity()
+    user = User.query.filter_by(email=user_email).first()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    # Each stream holds a worker thread; keep some free for normal requests
+    if event_hub.subscriber_count() >= app.config['SSE_MAX_STREAMS']:
+        response = jsonify({'error': 'Too many live update streams, try again shortly'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    user_id = user.id
+
+    def still_allowed():
+        with app.app_context():
+            return not purge.deletion_requested(user_id)
+
+    response = Response(stream_events(event_hub, user_id, expires_at=get_jwt().get('exp'),
+                                      still_allowed=still_allowed),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# ---------------- Admission metrics ----------------
+@app.route('/api/admission/metrics', methods=['GET'])
+def admission_metrics():
+    """Rate-limit counters for this worker process"""
+    return jsonify(admission.metrics()), 200
+
 # ---------------- User Auth ----------------
 @app.route('/register', methods=['POST'])
 def register():
@@ -292,10 +464,36 @@ def login():
     user = User.query.filter_by(email=email).first()
     if not user or not bcrypt.check_password_hash(user.password, password):
         return jsonify({'msg': 'Invalid email or password'}), 401
+    if purge.deletion_requested(user.id):
+        return jsonify({'msg': 'This account is being deleted'}), 403
 
-    access_token = create_access_token(identity=email, expires_delta=timedelta(hours=1))
+    # "uid" lets the mood ingest service (mood_routes.py) skip the user lookup
+    access_token = create_access_token(identity=email, additional_claims={'uid': user.id})
     return jsonify({'access_token': access_token}), 200
 
+@app.route('/api/account', methods=['DELETE'])
+@jwt_required()
+@idempotent
+def delete_account():
+    user_email = get_jwt_identity()
+    user = User.query.filter_by(email=user_email).first()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    job = purge.enqueue(user)
+    response = jsonify({'message': 'Account deletion started', 'job': job.to_dict()})
+    response.headers['Location'] = f'/api/account/deletion/{job.id}'
+    return response, 202
+
+@app.route('/api/account/deletion/<int:job_id>', methods=['GET'])
+@jwt_required()
+def account_deletion_status(job_id):
+    job = PurgeJob.query.get(job_id)
+    # By user id: the job's email is cleared once the purge is done
+    if not job or job.user_id != get_jwt().get('uid'):
+        return jsonify({'error': 'Deletion job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
 @app.route('/protected', methods=['GET'])
 @jwt_required()
 def protected():
@@ -310,6 +508,7 @@ def get_resources():
 
 @app.route('/api/resources', methods=['POST'])
 @jwt_required()
+@idempotent
 def add_resource():
     data = request.get_json()
     if not data.get('title') or not data.get('url'):
@@ -340,9 +539,61 @@ def add_resource():
     )
     db.session.add(resource)
     db.session.commit()
+    recommender.refresh()
 
     return jsonify({"message": "Resource added successfully", "id": resource.id}), 201
 
+@app.route('/api/resources/semantic', methods=['GET'])
+def semantic_resource_search():
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+
+    try:
+        hits = semantic_search.search(query, limit)
+    except SearchUnavailable as e:
+        logger.warning("Semantic search unavailable: %s", e)
+        return jsonify({"error": "Semantic search is not available"}), 503
+
+    by_id = {r.id: r for r in Resource.query.filter(Resource.id.in_([i for i, _ in hits])).all()}
+    results = []
+    for resource_id, score in hits:
+        if resource_id in by_id:
+            item = by_id[resource_id].to_dict()
+            item['score'] = round(score, 4)
+            results.append(item)
+    return jsonify(results), 200
+
+@app.route('/api/resources/recommended', methods=['GET'])
+@jwt_required()
+def get_recommended_resources():
+    user_email = get_jwt_identity()
+    user = User.query.filter_by(email=user_email).first()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    shards.bind_user(user.id)
+
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    recent = MoodEntry.query.filter_by(user_id=user.id).order_by(
+        MoodEntry.timestamp.desc()).limit(RECENT_MOODS).all()
+
+    recommender.refresh()
+    ids = recommender.recommend([m.mood for m in recent], limit)
+    if not ids:
+        # No mood history (or nothing relevant yet): fall back to the newest resources
+        resources = Resource.query.order_by(Resource.created_at.desc()).limit(limit).all()
+        return jsonify([r.to_dict() for r in resources]), 200
+
+    by_id = {r.id: r for r in Resource.query.filter(Resource.id.in_(ids)).all()}
+    return jsonify([by_id[i].to_dict() for i in ids if i in by_id]), 200
+
+# ---------------- CLI ----------------
+app.cli.add_command(shards.shards_cli)
+app.cli.add_command(search_cli)
+app.cli.add_command(mood_archive.moods_cli)
+app.cli.add_command(purge.purge_cli)
+
 # ---------------- Run App ----------------
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
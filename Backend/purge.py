@@ -0,0 +1,244 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import AppGroup
+
+import shards
+from models import db, User, PurgeJob
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Background account purge ----------------
+# DELETE /api/account only records a PurgeJob and returns 202. A worker thread
+# (one per process, or `flask purge run` as its own process) claims queued
+# jobs and deletes the user's rows a small batch at a time. Each batch is its
+# own short transaction, followed by a pause, so other requests can take the
+# SQLite writer lock between batches. The batch size adapts to keep each
+# transaction under PURGE_BATCH_BUDGET_MS.
+#
+# Progress is saved after every batch. A worker renews its claim by updating
+# the job's updated_at; a job whose claim is older than PURGE_LEASE_SECONDS
+# (e.g. its worker crashed) is picked up again and carries on. Deleting is
+# idempotent, so redoing part of a batch is harmless.
+
+PURGE_TABLES = ("mood_entry", "mood_archive", "booking", "emergency_contact")
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def active_job_for(user):
+    return PurgeJob.query.filter(PurgeJob.user_id == user.id,
+                                 PurgeJob.status.in_(ACTIVE_STATUSES)).first()
+
+
+def deletion_requested(user_id):
+    """True while a purge of this user is queued or running."""
+    return db.session.query(PurgeJob.query.filter(
+        PurgeJob.user_id == user_id, PurgeJob.status.in_(ACTIVE_STATUSES)).exists()).scalar()
+
+
+_jobs = PurgeJob.__table__
+# Jobs finished before "since" can be skipped: every token issued before them has
+# expired, and user ids aren't reused
+_deleted_users = sa.select(_jobs.c.user_id).where(sa.or_(
+    _jobs.c.status.in_(ACTIVE_STATUSES),
+    sa.and_(_jobs.c.status == "done", _jobs.c.finished_at >= sa.bindparam("since")))).distinct()
+# Built once: the write-behind writer runs this for every batch
+_deleted_users_among = _deleted_users.where(_jobs.c.user_id.in_(sa.bindparam("user_ids", expanding=True)))
+
+
+def users_being_deleted(engine, user_ids=None):
+    """Ids (of user_ids, or all) being deleted, or deleted while their tokens may still be valid."""
+    lifetime = current_app.config.get("JWT_ACCESS_TOKEN_EXPIRES", False)
+    if lifetime is False:
+        since = datetime.min  # tokens never expire
+    else:
+        since = datetime.utcnow() - (lifetime if isinstance(lifetime, timedelta) else timedelta(seconds=lifetime))
+    with engine.connect() as conn:
+        if user_ids is None:
+            return set(conn.execute(_deleted_users, {"since": since}).scalars())
+        return set(conn.execute(_deleted_users_among, {"since": since, "user_ids": list(user_ids)}).scalars())
+
+
+class AccountDeleted(Exception):
+    """The account a write is for is being (or has been) deleted."""
+
+
+def enqueue(user):
+    """Create (or return the already active) purge job for user."""
+    job = active_job_for(user)
+    if job is None:
+        job = PurgeJob(user_id=user.id, email=user.email, status="queued")
+        db.session.add(job)
+        db.session.commit()
+    purge_worker.wake()
+    return job
+
+
+class LeaseLost(Exception):
+    """Another worker took over the job."""
+
+
+class PurgeWorker:
+    def __init__(self, app=None):
+        self.app = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.token = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PURGE_WORKER", True)
+        app.config.setdefault("PURGE_BATCH_SIZE", 200)
+        app.config.setdefault("PURGE_MAX_BATCH_SIZE", 2000)
+        app.config.setdefault("PURGE_BATCH_BUDGET_MS", 20)
+        app.config.setdefault("PURGE_PAUSE_MS", 20)
+        app.config.setdefault("PURGE_LEASE_SECONDS", 60)
+        app.config.setdefault("PURGE_POLL_SECONDS", 5)
+        self.app = app
+
+    def wake(self):
+        self._wakeup.set()
+
+    def ensure_started(self):
+        # Started from the first request in each process (threads don't survive fork)
+        if not self.app.config["PURGE_WORKER"]:
+            return
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run_forever, name="purge-worker", daemon=True)
+            self._thread.start()
+
+    def run_forever(self, stop=None):
+        self.token = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        with self.app.app_context():
+            while stop is None or not stop.is_set():
+                try:
+                    worked = self.run_once()
+                except Exception:
+                    logger.exception("Purge worker iteration failed")
+                    worked = False
+                    db.session.rollback()
+                if not worked:
+                    self._wakeup.wait(self.app.config["PURGE_POLL_SECONDS"])
+                    self._wakeup.clear()
+
+    def run_once(self):
+        """Claim and finish one job; returns False when there was nothing to do."""
+        job_id = self.claim()
+        if job_id is None:
+            return False
+        try:
+            self.purge(job_id)
+        except LeaseLost:
+            logger.warning("Purge job %s was taken over by another worker", job_id)
+        except Exception as e:
+            logger.exception("Purge job %s failed", job_id)
+            db.session.rollback()
+            self._update(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+        return True
+
+    def claim(self):
+        jobs = PurgeJob.__table__
+        stale = datetime.utcnow() - timedelta(seconds=self.app.config["PURGE_LEASE_SECONDS"])
+        claimable = sa.or_(jobs.c.status == "queued",
+                           sa.and_(jobs.c.status == "running", jobs.c.updated_at < stale))
+        with db.engine.begin() as conn:
+            job_id = conn.execute(sa.select(jobs.c.id).where(claimable)
+                                  .order_by(jobs.c.id).limit(1)).scalar()
+            if job_id is None:
+                return None
+            claimed = conn.execute(jobs.update().where(jobs.c.id == job_id, claimable).values(
+                status="running", worker=self.token, updated_at=datetime.utcnow())).rowcount
+        return job_id if claimed else None
+
+    def purge(self, job_id):
+        job = db.session.get(PurgeJob, job_id)
+        user_id = job.user_id
+        db.session.commit()
+        engine = shards.engine_for_user(db, user_id)
+
+        self._delete_user_rows(job_id, engine, user_id)
+        # Core delete: the ORM would first load User.moods/bookings, which
+        # live on a shard this session isn't bound to
+        with db.engine.begin() as conn:
+            conn.execute(User.__table__.delete().where(User.__table__.c.id == user_id))
+        # Requests that were already past their user lookup may have written
+        # a few rows meanwhile; the user is gone now, so one more pass is final
+        self._delete_user_rows(job_id, engine, user_id)
+        self._update(job_id, status="done", current_table=None, email=None, finished_at=datetime.utcnow())
+
+    def _delete_user_rows(self, job_id, engine, user_id):
+        config = self.app.config
+        batch_size = config["PURGE_BATCH_SIZE"]
+        budget = config["PURGE_BATCH_BUDGET_MS"] / 1000.0
+        tables = [db.metadata.tables[name] for name in PURGE_TABLES]
+        for table in tables:
+            self._update(job_id, current_table=table.name)
+            while True:
+                started = time.perf_counter()
+                with engine.begin() as conn:
+                    ids = conn.execute(sa.select(table.c.id).where(table.c.user_id == user_id)
+                                       .limit(batch_size)).scalars().all()
+                    if ids:
+                        conn.execute(table.delete().where(table.c.id.in_(ids)))
+                elapsed = time.perf_counter() - started
+                if not ids:
+                    break
+                self._update(job_id, deleted_rows=PurgeJob.__table__.c.deleted_rows + len(ids))
+
+                # Keep each transaction inside the budget
+                if elapsed > budget:
+                    batch_size = max(10, batch_size // 2)
+                elif elapsed < budget / 2:
+                    batch_size = min(config["PURGE_MAX_BATCH_SIZE"], batch_size * 2)
+                time.sleep(config["PURGE_PAUSE_MS"] / 1000.0)
+
+    def _update(self, job_id, **values):
+        """Save progress and renew our claim on the job."""
+        jobs = PurgeJob.__table__
+        values["updated_at"] = datetime.utcnow()
+        with db.engine.begin() as conn:
+            updated = conn.execute(jobs.update().where(
+                jobs.c.id == job_id, jobs.c.worker == self.token).values(**values)).rowcount
+        if not updated:
+            raise LeaseLost()
+
+
+purge_worker = PurgeWorker()
+
+
+# ---------------- CLI: flask purge ... ----------------
+purge_cli = AppGroup("purge", help="Account deletion jobs.")
+
+
+@purge_cli.command("run")
+@click.option("--once", is_flag=True, help="Process the queued jobs and exit.")
+def run_command(once):
+    """Run the purge worker in the foreground."""
+    if once:
+        purge_worker.token = f"{os.getpid()}-cli"
+        while purge_worker.run_once():
+            pass
+    else:
+        purge_worker.run_forever()
+
+
+@purge_cli.command("status")
+def status_command():
+    """List purge jobs that have not finished."""
+    for job in PurgeJob.query.filter(PurgeJob.status.in_(ACTIVE_STATUSES + ("failed",))).all():
+        click.echo(f"{job.id}\t{job.status}\t{job.email}\t{job.current_table or '-'}\t{job.deleted_rows} rows")
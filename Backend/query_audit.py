@@ -0,0 +1,210 @@
+"""Query-plan audit for the API routes in myapp.py.
+
+Seeds a scratch SQLite database, drives every route through the Flask test
+client, records each SQL statement they issue and runs EXPLAIN QUERY PLAN on it.
+A filtered statement that full-scans (or sorts in a temp b-tree) a table holding
+at least --threshold rows is reported, and the script exits non-zero so it can
+run as a CI check:
+
+    python query_audit.py [--threshold 100]
+
+tests/test_query_audit.py runs the same audit under pytest.
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import tempfile
+import warnings
+from datetime import datetime
+
+SCAN_RE = re.compile(r"^SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?")
+TEMP_SORT_RE = re.compile(r"USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)")
+
+
+def seed(db, rows):
+    from models import User, MoodEntry, Therapist, TherapistAvailability, Booking, Resource, EmergencyContact
+
+    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+    slots = ["09:00", "10:00", "11:00", "13:00", "14:00", "15:00"]
+
+    users = [User(username=f"user{i}", email=f"user{i}@example.com", password="x")
+             for i in range(rows)]
+    therapists = [Therapist(name=f"Therapist {i}", specialization="Anxiety, Stress")
+                  for i in range(max(rows // 10, 2))]
+    db.session.add_all(users + therapists)
+    db.session.flush()
+
+    for t in therapists:
+        db.session.add_all(TherapistAvailability(therapist_id=t.id, day=d, slot=s)
+                           for d in days for s in slots)
+    for i in range(rows):
+        user = users[i % len(users)]
+        t = therapists[i % len(therapists)]
+        db.session.add(Booking(user_id=user.id, therapist_id=t.id,
+                               day=days[i % len(days)], slot=slots[(i // len(days)) % len(slots)]))
+        db.session.add(MoodEntry(user_id=user.id, mood="anxious", note="seed"))
+        db.session.add(Resource(title=f"Resource {i}", url=f"https://example.com/{i}",
+                                tags="stress, sleep", created_at=datetime.utcnow()))
+        db.session.add(EmergencyContact(user_id=user.id, name="Contact", phone="000"))
+    db.session.commit()
+
+
+def free_slots():
+    from models import Booking, TherapistAvailability
+
+    booked = {(b.therapist_id, b.day, b.slot) for b in Booking.query.all()}
+    return [(a.therapist_id, a.day, a.slot) for a in TherapistAvailability.query.all()
+            if (a.therapist_id, a.day, a.slot) not in booked]
+
+
+class AuditEncoder:
+    """Stands in for the embedding model: the audit only looks at the SQL."""
+
+    def encode(self, texts, batch_size=32):
+        import numpy as np
+        from semantic_search import normalize
+        rng = np.random.default_rng(len(texts))
+        return normalize(rng.standard_normal((len(texts), 8)).astype(np.float32))
+
+
+def build_semantic_index(app, prefix):
+    from models import Resource
+    from semantic_search import semantic_search, write_index
+
+    with app.app_context():
+        ids = [r.id for r in Resource.query.order_by(Resource.id).all()]
+    semantic_search.encoder = AuditEncoder()
+    semantic_search.prefix = prefix
+    write_index(prefix, ids, semantic_search.encoder.encode(ids))
+
+
+def exercise_routes(app, free):
+    """Call each API route once with plausible input."""
+    client = app.test_client()
+    client.post('/register', json={'username': 'audit', 'email': 'audit@example.com', 'password': 'pw'})
+    token = client.post('/login', json={'email': 'audit@example.com', 'password': 'pw'}).json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    client.get('/protected', headers=headers)
+    client.get('/api/therapists')
+    client.get('/api/resources')
+    client.get('/api/resources/semantic', query_string={'q': 'trouble sleeping'})
+    client.post('/api/resources', headers=headers, json={'title': 'Audit', 'url': 'https://example.com'})
+
+    therapist_id, day, slot = free[0]
+    booking_id = client.post('/api/bookings', headers=headers, json={
+        'therapistId': therapist_id, 'day': day, 'slot': slot}).json['booking']['id']
+    client.get('/api/bookings', headers=headers)
+    _, new_day, new_slot = next(f for f in free[1:] if f[0] == therapist_id)
+    client.put(f'/api/bookings/{booking_id}', headers=headers, json={'day': new_day, 'slot': new_slot})
+    client.delete(f'/api/bookings/{booking_id}', headers=headers)
+
+    client.post('/api/mood', headers=headers, json={'mood': 'happy', 'note': 'audit'})
+    mood_id = client.get('/api/moods', headers=headers).json[0]['id']
+    client.get('/api/moods?from=2000-01-01&to=2100-01-01', headers=headers)  # reaches the archive
+    client.put(f'/api/mood/{mood_id}', headers=headers, json={'note': 'edited'})
+    client.get('/api/resources/recommended', headers=headers)
+    client.delete(f'/api/mood/{mood_id}', headers=headers)
+
+    job_id = client.delete('/api/account', headers=headers).json['job']['id']
+    client.get(f'/api/account/deletion/{job_id}', headers=headers)
+
+
+def explain(conn, statement, parameters):
+    plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return [row[3] for row in plan]
+
+
+def find_problems(plan, statement, row_counts, threshold):
+    problems = []
+    filtered = re.search(r"\bWHERE\b", statement, re.IGNORECASE) is not None
+    for detail in plan:
+        scan = SCAN_RE.match(detail)
+        if scan and not scan.group(2) and filtered:
+            table = scan.group(1)
+            if row_counts.get(table, 0) >= threshold:
+                problems.append(f"full scan of {table} ({row_counts[table]} rows)")
+        if TEMP_SORT_RE.search(detail):
+            tables = [t for t in row_counts if re.search(rf'\b{t}\b', statement)]
+            if any(row_counts[t] >= threshold for t in tables):
+                problems.append(f"temp b-tree sort: {detail}")
+    return problems
+
+
+def audit(threshold=100, rows=None):
+    """Return (statement, plan, problems) for every distinct statement the routes issue."""
+    fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['PURGE_WORKER'] = '0'
+    os.environ['RATE_LIMIT_ENABLED'] = '0'  # drives every route back to back
+
+    from sqlalchemy import event, inspect
+    from myapp import app, db
+
+    try:
+        with app.app_context():
+            db.create_all()
+            seed(db, rows or threshold * 2)
+            engine = db.engine
+            row_counts = {t: db.session.execute(db.text(f'SELECT COUNT(*) FROM "{t}"')).scalar()
+                          for t in inspect(engine).get_table_names()}
+            free = free_slots()
+        build_semantic_index(app, db_path[:-len(".db")] + "_embeddings")
+
+        captured = {}
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            verb = statement.lstrip().split(None, 1)[0].upper()
+            if not executemany and verb in ("SELECT", "UPDATE", "DELETE"):
+                captured.setdefault(statement, parameters)
+
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            exercise_routes(app, free)
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+
+        results = []
+        with engine.connect() as conn:
+            for statement, parameters in captured.items():
+                plan = explain(conn, statement, parameters)
+                results.append((statement, plan, find_problems(plan, statement, row_counts, threshold)))
+        return results
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        for path in [db_path] + glob.glob(db_path[:-len(".db")] + "_embeddings.*"):
+            os.unlink(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail on full table scans issued by the API routes")
+    parser.add_argument("--threshold", type=int, default=100,
+                        help="only report scans of tables with at least this many rows")
+    parser.add_argument("--verbose", action="store_true", help="print every statement and its plan")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    results = audit(args.threshold)
+    failures = [r for r in results if r[2]]
+
+    print(f"Audited {len(results)} distinct statements")
+    for statement, plan, problems in (results if args.verbose else failures):
+        print("-" * 60)
+        print(" ".join(statement.split()))
+        for detail in plan:
+            print(f"    {detail}")
+        for problem in problems:
+            print(f"  ! {problem}")
+
+    if failures:
+        print(f"{len(failures)} statement(s) need an index")
+        sys.exit(1)
+    print("No full table scans above threshold")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+import threading
+
+import numpy as np
+from sqlalchemy import func
+
+from models import db, Resource
+
+# ---------------- Mood-based resource recommendations ----------------
+# Resources are kept as a (resources x tags) matrix and moods as a
+# (moods x tags) affinity matrix. A user's recent moods become a distribution
+# over moods, and scoring the whole catalog is two matrix products:
+#     scores = resources @ (affinity.T @ mood_distribution)
+# New resources are appended to the matrices as they appear (resource ids are
+# AUTOINCREMENT, so they only grow); the index is only rebuilt from scratch
+# when resources were deleted.
+
+# How much each mood from the journal favours a resource tag. Tags missing
+# here score 0 for that mood; moods missing here are ignored, so the keys are
+# the moods the client's MoodForm offers.
+MOOD_TAG_AFFINITY = {
+    "happy": {"mindfulness": 0.6, "meditation": 0.5, "mental health": 0.3, "cbt": 0.2},
+    "neutral": {"mental health": 0.6, "mindfulness": 0.5, "stress": 0.3, "cbt": 0.3},
+    "sad": {"depression": 1.0, "coping": 0.7, "therapy": 0.6, "cbt": 0.5, "symptoms": 0.4,
+            "mental health": 0.3},
+    "angry": {"stress": 1.0, "stress relief": 1.0, "relaxation": 0.8, "breathing": 0.8,
+              "anxiety": 0.5, "mindfulness": 0.4},
+    "anxious": {"anxiety": 1.0, "breathing": 0.8, "relaxation": 0.7, "coping": 0.7,
+                "stress": 0.5, "stress relief": 0.5, "mindfulness": 0.4, "meditation": 0.3},
+}
+
+RECENT_MOODS = 20
+VERIFIED_BOOST = 1.1
+
+
+def normalize_tag(tag):
+    return tag.strip().lower()
+
+
+def mood_distribution(moods, mood_names):
+    """Share of each known mood among `moods`; unknown moods are skipped."""
+    positions = {m: i for i, m in enumerate(mood_names)}
+    weights = np.zeros(len(mood_names), dtype=np.float32)
+    for mood in moods:
+        pos = positions.get(mood.strip().lower())
+        if pos is not None:
+            weights[pos] += 1
+    total = weights.sum()
+    return weights / total if total else weights
+
+
+class ResourceIndex:
+    def __init__(self, affinity=MOOD_TAG_AFFINITY):
+        self.moods = list(affinity)
+        self._affinity_spec = {m: {normalize_tag(t): w for t, w in tags.items()}
+                               for m, tags in affinity.items()}
+        self.tags = []
+        self._tag_pos = {}
+        self.size = 0
+        self.last_id = 0
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.verified = np.zeros(0, dtype=bool)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)      # resources x tags
+        self.affinity = np.zeros((len(self.moods), 0), dtype=np.float32)  # moods x tags
+        self._lock = threading.Lock()
+
+    def add(self, rows):
+        """Append (id, tags, verified) rows; tags is a list of strings."""
+        rows = [r for r in rows if r[0] > self.last_id]
+        if not rows:
+            return
+        with self._lock:
+            for _, tags, _ in rows:
+                for tag in tags:
+                    self._ensure_tag(normalize_tag(tag))
+            self._ensure_rows(self.size + len(rows))
+            for resource_id, tags, verified in rows:
+                cols = sorted({self._tag_pos[normalize_tag(t)] for t in tags})
+                if cols:
+                    # Unit-length rows so many-tagged resources don't win by volume
+                    self.matrix[self.size, cols] = 1.0 / np.sqrt(len(cols))
+                self.ids[self.size] = resource_id
+                self.verified[self.size] = bool(verified)
+                self.size += 1
+                self.last_id = max(self.last_id, resource_id)
+
+    def scores(self, mood_weights):
+        # Spare tag columns are all zero, so use the full (contiguous) width
+        tag_weights = mood_weights @ self.affinity
+        scores = self.matrix[:self.size] @ tag_weights
+        scores[self.verified[:self.size]] *= VERIFIED_BOOST
+        return scores
+
+    def recommend(self, mood_weights, limit):
+        """Ids of the `limit` best-scoring resources, best first (positive scores only)."""
+        with self._lock:
+            if not self.size or not mood_weights.any():
+                return []
+            scores = self.scores(mood_weights)
+            if limit < self.size:
+                top = np.argpartition(-scores, limit)[:limit]
+            else:
+                top = np.arange(self.size)
+            top = top[np.argsort(-scores[top], kind="stable")]
+            top = top[scores[top] > 0]
+            return self.ids[top].tolist()
+
+    def _ensure_tag(self, tag):
+        if tag in self._tag_pos:
+            return
+        pos = len(self.tags)
+        self._tag_pos[tag] = pos
+        self.tags.append(tag)
+        if pos >= self.matrix.shape[1]:
+            new_cols = max(16, self.matrix.shape[1] * 2)
+            self.matrix = _grow(self.matrix, self.matrix.shape[0], new_cols)
+            self.affinity = _grow(self.affinity, self.affinity.shape[0], new_cols)
+        for i, mood in enumerate(self.moods):
+            self.affinity[i, pos] = self._affinity_spec[mood].get(tag, 0.0)
+
+    def _ensure_rows(self, needed):
+        capacity = self.matrix.shape[0]
+        if needed <= capacity:
+            return
+        new_rows = max(needed, 64, capacity * 2)
+        self.matrix = _grow(self.matrix, new_rows, self.matrix.shape[1])
+        self.ids = np.resize(self.ids, new_rows)
+        self.verified = np.resize(self.verified, new_rows)
+
+
+def _grow(array, rows, cols):
+    grown = np.zeros((rows, cols), dtype=array.dtype)
+    grown[:array.shape[0], :array.shape[1]] = array
+    return grown
+
+
+class Recommender:
+    """Keeps a ResourceIndex in step with the Resource table."""
+
+    def __init__(self):
+        self.index = ResourceIndex()
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self):
+        # Ids past the newest one indexed are new rows; if the count still doesn't
+        # add up, some resources were deleted and the index is rebuilt
+        count, newest = db.session.query(func.count(Resource.id), func.max(Resource.id)).one()
+        if (newest or 0) <= self.index.last_id and count == self.index.size:
+            return
+        with self._refresh_lock:
+            index = self.index
+            new = (Resource.query.filter(Resource.id > index.last_id)
+                   .order_by(Resource.id).all())
+            if index.size + len(new) != count:
+                index = ResourceIndex()
+                new = Resource.query.order_by(Resource.id).all()
+            self.add(new, index)
+            self.index = index
+
+    def add(self, resources, index=None):
+        index = self.index if index is None else index
+        index.add([(r.id, r.to_dict()["tags"], r.verified) for r in resources])
+
+    def recommend(self, moods, limit=10):
+        index = self.index
+        return index.recommend(mood_distribution(moods, index.moods), limit)
+
+
+recommender = Recommender()
@@ -0,0 +1,240 @@
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+
+import click
+import numpy as np
+from flask.cli import AppGroup
+
+from models import Resource
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Semantic resource search ----------------
+# Resource embeddings are computed offline (flask search build-index) with a
+# small CPU sentence model and written next to the database as .npy files:
+#   <prefix>.ids.npy      resource ids, int64
+#   <prefix>.vectors.npy  unit-length float32 embeddings, memory-mapped at query time
+#   <prefix>.ivf.npz      optional coarse clustering for large catalogs
+# A request only embeds the query (cached in an LRU) and scans the matrix with
+# one matrix-vector product, or only the nearest clusters when the IVF file exists.
+
+EMBED_MODEL = os.environ.get("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+IVF_MIN_RESOURCES = 20000  # below this a full scan is already fast
+IVF_PROBES = 8
+QUERY_CACHE_SIZE = 1024
+LOAD_RETRY_SECONDS = 300  # after a failed model load
+
+
+class SearchUnavailable(Exception):
+    """No index has been built, or the embedding model can't be loaded."""
+
+
+class Encoder:
+    """Mean-pooled sentence embeddings from a Hugging Face model, on CPU."""
+
+    def __init__(self, model_name=EMBED_MODEL, retry_seconds=LOAD_RETRY_SECONDS):
+        self.model_name = model_name
+        self.retry_seconds = retry_seconds
+        self._model = None
+        self._tokenizer = None
+        self._failure = None  # (monotonic time, message) of the last failed load
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is not None:
+                return
+            # Don't retry a failed load (e.g. a download while offline) on every request
+            if self._failure and time.monotonic() - self._failure[0] < self.retry_seconds:
+                raise SearchUnavailable(self._failure[1])
+            try:
+                import torch  # noqa: F401
+                from transformers import AutoModel, AutoTokenizer
+            except ImportError as e:
+                self._fail(f"transformers/torch not installed: {e}")
+            try:
+                tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                model = AutoModel.from_pretrained(self.model_name).eval()
+            except Exception as e:
+                logger.exception("Loading embedding model %s failed", self.model_name)
+                self._fail(f"embedding model {self.model_name} could not be loaded: {e}")
+            self._tokenizer, self._model, self._failure = tokenizer, model, None
+
+    def _fail(self, message):
+        self._failure = (time.monotonic(), message)
+        raise SearchUnavailable(message)
+
+    def encode(self, texts, batch_size=32):
+        self._load()
+        import torch
+
+        chunks = []
+        with torch.no_grad():
+            for start in range(0, len(texts), batch_size):
+                batch = self._tokenizer(texts[start:start + batch_size], padding=True,
+                                        truncation=True, max_length=256, return_tensors="pt")
+                hidden = self._model(**batch).last_hidden_state
+                mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+                chunks.append(pooled.numpy().astype(np.float32))
+        if not chunks:
+            return np.zeros((0, 0), dtype=np.float32)
+        return normalize(np.vstack(chunks))
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def resource_text(resource):
+    parts = [resource.title, resource.summary or "", resource.tags or ""]
+    return ". ".join(p.strip() for p in parts if p and p.strip())
+
+
+# ---------------- Index files ----------------
+def write_index(prefix, ids, vectors, ivf_min=IVF_MIN_RESOURCES):
+    """Write the index files, each atomically.
+
+    The ids file goes last: readers reload when its mtime changes, so by then
+    the matching vectors and IVF files are already in place.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    _save_atomic(f"{prefix}.vectors.npy", vectors)
+
+    ivf_path = f"{prefix}.ivf.npz"
+    if len(ids) >= ivf_min:
+        centroids, order, offsets = build_ivf(vectors)
+        tmp = f"{prefix}.ivf.tmp.npz"
+        np.savez(tmp, centroids=centroids, order=order, offsets=offsets)
+        os.replace(tmp, ivf_path)
+    elif os.path.exists(ivf_path):
+        os.remove(ivf_path)
+
+    _save_atomic(f"{prefix}.ids.npy", ids)
+
+
+def _save_atomic(path, array):
+    tmp = path[:-len(".npy")] + ".tmp.npy"
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+def build_ivf(vectors, n_lists=None, iterations=10, seed=0):
+    """Spherical k-means; returns centroids and rows grouped by nearest centroid."""
+    n = len(vectors)
+    n_lists = n_lists or max(16, int(np.sqrt(n)))
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(n, size=min(n, n_lists * 64), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = sample[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = normalize(centroids)
+
+    assign = np.concatenate([np.argmax(vectors[i:i + 8192] @ centroids.T, axis=1)
+                             for i in range(0, n, 8192)])
+    order = np.argsort(assign, kind="stable")
+    offsets = np.searchsorted(assign[order], np.arange(n_lists + 1))
+    return centroids.astype(np.float32), order.astype(np.int64), offsets.astype(np.int64)
+
+
+class EmbeddingIndex:
+    def __init__(self, ids, vectors, ivf=None):
+        self.ids = ids
+        self.vectors = vectors
+        self.ivf = ivf
+
+    @classmethod
+    def load(cls, prefix):
+        ids = np.load(f"{prefix}.ids.npy")
+        vectors = np.load(f"{prefix}.vectors.npy", mmap_mode="r")
+        ivf = None
+        if os.path.exists(f"{prefix}.ivf.npz"):
+            with np.load(f"{prefix}.ivf.npz") as data:
+                ivf = (data["centroids"], data["order"], data["offsets"])
+        return cls(ids, vectors, ivf)
+
+    def search(self, query, k, probes=IVF_PROBES):
+        """Return [(resource_id, score)] for the k nearest resources."""
+        if len(self.ids) == 0:
+            return []
+        if self.ivf is not None:
+            centroids, order, offsets = self.ivf
+            nearest = np.argpartition(-(centroids @ query), min(probes, len(centroids) - 1))[:probes]
+            rows = np.sort(np.concatenate([order[offsets[c]:offsets[c + 1]] for c in nearest]))
+            scores = self.vectors[rows] @ query
+        else:
+            rows = None
+            scores = self.vectors @ query
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        positions = top if rows is None else rows[top]
+        return [(int(self.ids[p]), float(scores[t])) for p, t in zip(positions, top)]
+
+
+class SemanticSearch:
+    """Loads the index lazily and reloads it when build-index replaces the files."""
+
+    def __init__(self, prefix=None, encoder=None):
+        self.prefix = prefix
+        self.encoder = encoder or Encoder()
+        self._index = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.embed_query = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._embed_query)
+
+    def init_app(self, app):
+        self.prefix = app.config["SEMANTIC_INDEX_PREFIX"]
+
+    def _embed_query(self, text):
+        vector = self.encoder.encode([text])[0]
+        vector.setflags(write=False)
+        return vector
+
+    def index(self):
+        try:
+            mtime = os.stat(f"{self.prefix}.ids.npy").st_mtime_ns
+        except FileNotFoundError:
+            raise SearchUnavailable("semantic index has not been built")
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._index = EmbeddingIndex.load(self.prefix)
+                    self._mtime = mtime
+        return self._index
+
+    def search(self, query, k=10):
+        index = self.index()
+        return index.search(self.embed_query(" ".join(query.lower().split())), k)
+
+
+# ---------------- CLI: flask search ... ----------------
+search_cli = AppGroup("search", help="Semantic resource search.")
+
+
+@search_cli.command("build-index")
+@click.option("--batch-size", type=int, default=32, show_default=True)
+def build_index_command(batch_size):
+    """Embed every resource and write the search index files."""
+    search = semantic_search
+    resources = Resource.query.order_by(Resource.id).all()
+    try:
+        vectors = search.encoder.encode([resource_text(r) for r in resources], batch_size)
+    except SearchUnavailable as e:
+        raise click.ClickException(str(e))
+    write_index(search.prefix, [r.id for r in resources], vectors)
+    click.echo(f"Indexed {len(resources)} resource(s) into {search.prefix}.*")
+
+
+semantic_search = SemanticSearch()
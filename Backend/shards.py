@@ -0,0 +1,308 @@
+import click
+import sqlalchemy as sa
+from flask import g, has_app_context
+from flask.cli import AppGroup
+from flask_sqlalchemy.session import Session
+
+# ---------------- Per-user sharding ----------------
+# With SHARD_COUNT > 1, the per-user tables below live in N SQLite files, one
+# per bind "shard0".."shardN-1", and a user's rows go to shard user_id % N.
+# Everything else (user, therapist, availability, resource) stays on the
+# default database. Each file has its own writer lock, so writes for different
+# users no longer queue behind each other.
+#
+# Routes call bind_user(user.id) once they know who is asking; from then on
+# db.session sends queries for the sharded models to that user's file. Ids are
+# only unique within a shard, so anything that looks across users (e.g. "is
+# this slot already booked?") goes through query_all_shards() instead of the
+# ORM session.
+
+SHARDED_TABLES = frozenset({"mood_entry", "mood_archive", "booking", "emergency_contact"})
+
+# Tables whose rows carry ids of another table (registered by mood_archive.py):
+#   copy_hooks[table]      [fn(conn, rows) -> rows], run on the target before rebalance inserts them
+#   id_floor_hooks[table]  [fn(conn) -> highest id of `table` in use outside its rows]
+copy_hooks = {}
+id_floor_hooks = {}
+
+
+def shard_count(app):
+    return app.config.get("SHARD_COUNT", 1)
+
+
+def shard_key(user_id, count):
+    return f"shard{user_id % count}"
+
+
+def configure(app, count, url_template):
+    """Set SQLALCHEMY_BINDS for `count` shards; call before db.init_app."""
+    app.config["SHARD_COUNT"] = count
+    app.config["SHARD_URL_TEMPLATE"] = url_template
+    if count > 1:
+        binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+        for i in range(count):
+            binds[f"shard{i}"] = url_template.format(i)
+
+
+def bind_user(user_id):
+    """Route this request's sharded queries to the shard owning user_id."""
+    g.shard_user_id = user_id
+
+
+def engine_for_user(db, user_id):
+    from flask import current_app
+    count = shard_count(current_app)
+    if count <= 1:
+        return db.engine
+    return db.engines[shard_key(user_id, count)]
+
+
+def shard_engines(db):
+    """Every engine that may hold per-user rows (just the default when unsharded)."""
+    from flask import current_app
+    count = shard_count(current_app)
+    if count <= 1:
+        return [db.engine]
+    return [db.engines[f"shard{i}"] for i in range(count)]
+
+
+def query_all_shards(db, stmt):
+    """Run a Core select on every shard and return all rows."""
+    rows = []
+    for engine in shard_engines(db):
+        with engine.connect() as conn:
+            rows.extend(conn.execute(stmt).all())
+    return rows
+
+
+def sharded_tables(db):
+    return [t for name, t in db.metadata.tables.items() if name in SHARDED_TABLES]
+
+
+def create_all(db):
+    """Create the per-user tables on every shard (db.create_all covers the rest)."""
+    tables = sharded_tables(db)
+    for engine in shard_engines(db):
+        db.metadata.create_all(engine, tables=tables)
+
+
+def sync_schema(db):
+    """Bring existing shard files up to the models; returns a list of changes.
+
+    Alembic only migrates the main database, so a migration that touches a
+    per-user table never reaches shard files that already exist. This creates
+    missing tables and indexes and adds missing columns; anything else is
+    reported for a manual fix.
+    """
+    changes = []
+    tables = sharded_tables(db)
+    for engine in shard_engines(db):
+        if engine is db.engine:
+            continue  # the main database is Alembic's
+        inspector = sa.inspect(engine)
+        existing = set(inspector.get_table_names())
+        db.metadata.create_all(engine, tables=tables)
+        for table in tables:
+            if table.name not in existing:
+                changes.append(f"{engine.url.database}: created {table.name}")
+                continue
+            columns = {c["name"] for c in inspector.get_columns(table.name)}
+            indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            with engine.begin() as conn:
+                if _needs_autoincrement(conn, table):
+                    _rebuild_with_autoincrement(conn, table, columns)
+                    changes.append(f"{engine.url.database}: rebuilt {table.name} with AUTOINCREMENT")
+                    columns = {c.name for c in table.columns}
+                    indexes = {i.name for i in table.indexes}
+                for column in table.columns:
+                    if column.name in columns:
+                        continue
+                    if not column.nullable and column.server_default is None:
+                        changes.append(f"{engine.url.database}: cannot add NOT NULL column "
+                                       f"{table.name}.{column.name} without a server default")
+                        continue
+                    ddl = sa.schema.CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}')
+                    changes.append(f"{engine.url.database}: added {table.name}.{column.name}")
+                for index in table.indexes:
+                    if index.name not in indexes:
+                        index.create(conn)
+                        changes.append(f"{engine.url.database}: created index {index.name}")
+    return changes
+
+
+class ShardedSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and _touches_sharded_table(mapper, clause):
+            from flask import current_app
+            count = shard_count(current_app)
+            if count > 1:
+                user_id = g.get("shard_user_id")
+                if user_id is None:
+                    raise RuntimeError("Query on a sharded table before shards.bind_user()")
+                return self._db.engines[shard_key(user_id, count)]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _touches_sharded_table(mapper, clause):
+    if mapper is not None:
+        return sa.inspect(mapper).local_table.name in SHARDED_TABLES
+    table = None
+    if isinstance(clause, sa.Table):
+        table = clause
+    elif isinstance(clause, sa.sql.dml.UpdateBase):
+        table = clause.table
+    return table is not None and table.name in SHARDED_TABLES
+
+
+# ---------------- CLI: flask shards ... ----------------
+shards_cli = AppGroup("shards", help="Manage per-user database shards.")
+
+
+@shards_cli.command("init")
+def init_command():
+    """Create the per-user tables on every shard and update existing ones.
+
+    Run it after `flask db upgrade` whenever a migration changed a per-user table.
+    """
+    from models import db
+    for change in sync_schema(db):
+        click.echo(change)
+    click.echo(f"Initialised {len(shard_engines(db))} shard(s)")
+
+
+@shards_cli.command("rebalance")
+@click.option("--from-count", type=int, required=True,
+              help="SHARD_COUNT the data is laid out for now (1 = the main database).")
+@click.option("--batch-size", type=int, default=500, show_default=True)
+def rebalance_command(from_count, batch_size):
+    """Move per-user rows to the shard the current SHARD_COUNT assigns them.
+
+    Run it with the new SHARD_COUNT set, e.g. going from the single database
+    to four shards:  SHARD_COUNT=4 flask shards rebalance --from-count 1
+    """
+    from flask import current_app
+    from models import db
+
+    sync_schema(db)
+    if from_count <= 1:
+        sources = [db.engine]
+    else:
+        template = current_app.config["SHARD_URL_TEMPLATE"]
+        sources = [sa.create_engine(template.format(i)) for i in range(from_count)]
+    moved = rebalance(db, sources, batch_size)
+    for table, count in moved.items():
+        click.echo(f"{table}: moved {count} row(s)")
+
+
+def _needs_autoincrement(conn, table):
+    if not table.dialect_options["sqlite"]["autoincrement"]:
+        return False
+    sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                               (table.name,)).scalar() or ""
+    return "AUTOINCREMENT" not in sql.upper()
+
+
+def _rebuild_with_autoincrement(conn, table, columns):
+    """Recreate `table` from the models, keeping rows and ids (SQLite can't ALTER this)."""
+    old = f"_old_{table.name}"
+    conn.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{old}"')
+    for index in table.indexes:
+        conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{index.name}"')
+    table.create(conn)
+    shared = ", ".join(f'"{c.name}"' for c in table.columns if c.name in columns)
+    conn.exec_driver_sql(f'INSERT INTO "{table.name}" ({shared}) SELECT {shared} FROM "{old}"')
+    conn.exec_driver_sql(f'DROP TABLE "{old}"')
+    seed_sequence(conn, table)
+
+
+def seed_sequence(conn, table):
+    """Start an AUTOINCREMENT sequence above every id in use, including ones kept outside the table."""
+    floor = max([conn.execute(sa.select(sa.func.max(table.c.id))).scalar() or 0] +
+                [hook(conn) for hook in id_floor_hooks.get(table.name, ())])
+    seq = conn.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = ?", (table.name,)).scalar()
+    if seq is None:
+        conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table.name, floor))
+    elif seq < floor:
+        conn.exec_driver_sql("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (floor, table.name))
+    return max(seq or 0, floor)
+
+
+def reserve_ids(conn, table, count):
+    """Take `count` fresh ids from an AUTOINCREMENT table's sequence without inserting."""
+    seq = conn.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = ?", (table.name,)).scalar()
+    if seq is None:
+        seq = seed_sequence(conn, table)
+    conn.exec_driver_sql("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (seq + count, table.name))
+    return list(range(seq + 1, seq + count + 1))
+
+
+# Rows copied by rebalance, per target file. The insert and its log entry
+# commit together; the delete on the source is a separate transaction, so
+# after a crash in between a re-run finds the log entry and only deletes.
+move_log = sa.Table(
+    "shard_move", sa.MetaData(),
+    sa.Column("table_name", sa.String(64), primary_key=True),
+    sa.Column("source", sa.String(255), primary_key=True),
+    sa.Column("source_id", sa.Integer, primary_key=True),
+    sa.Column("target_id", sa.Integer, nullable=False),
+)
+
+
+def rebalance(db, sources, batch_size=500):
+    """Copy misplaced per-user rows from `sources` to their shard, batch by batch.
+
+    Each batch is inserted into its target and then deleted from the source in
+    short transactions, so live traffic keeps getting the writer lock between
+    batches. Moved rows get new ids on their target shard. Safe to re-run
+    after an interruption (see move_log) with the same --from-count.
+    """
+    moved = {}
+    for table in sharded_tables(db):
+        moved[table.name] = 0
+        for source in sources:
+            if not sa.inspect(source).has_table(table.name):
+                continue
+            last_id = 0
+            while True:
+                with source.connect() as conn:
+                    rows = conn.execute(
+                        sa.select(table).where(table.c.id > last_id)
+                        .order_by(table.c.id).limit(batch_size)).mappings().all()
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+                by_target = {}
+                for row in rows:
+                    target = engine_for_user(db, row["user_id"])
+                    if str(target.url) != str(source.url):
+                        by_target.setdefault(target, []).append(row)
+                for target, batch in by_target.items():
+                    with target.begin() as conn:
+                        _copy_rows(conn, table, str(source.url), batch)
+                    with source.begin() as conn:
+                        conn.execute(table.delete().where(table.c.id.in_([r["id"] for r in batch])))
+                    moved[table.name] += len(batch)
+    # Finished: a later rebalance must not mistake reused ids for copied rows
+    for engine in shard_engines(db):
+        move_log.drop(engine, checkfirst=True)
+    return moved
+
+
+def _copy_rows(conn, table, source, batch):
+    """Insert the rows not already copied from `source` and log them."""
+    move_log.create(conn, checkfirst=True)
+    done = set(conn.execute(sa.select(move_log.c.source_id).where(
+        move_log.c.table_name == table.name, move_log.c.source == source,
+        move_log.c.source_id.in_([r["id"] for r in batch]))).scalars())
+    todo = [r for r in batch if r["id"] not in done]
+    if not todo:
+        return
+    for hook in copy_hooks.get(table.name, ()):
+        todo = hook(conn, todo)
+    columns = [c for c in table.columns if c.name != "id"]
+    stmt = table.insert().returning(table.c.id, sort_by_parameter_order=True)
+    new_ids = conn.execute(stmt, [{c.name: r[c.name] for c in columns} for r in todo]).scalars().all()
+    conn.execute(move_log.insert(), [
+        {"table_name": table.name, "source": source, "source_id": r["id"], "target_id": new_id}
+        for r, new_id in zip(todo, new_ids)])
@@ -0,0 +1,25 @@
+import os
+import sys
+
+# The app modules import each other as top-level modules (run from Backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The mood ingest app on a scratch database (shares the models and the mood writer)."""
+    from models import db
+    from mood_routes import create_app
+    from write_behind import mood_writer
+
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'users.db'}",
+        "SHARD_COUNT": 1,
+        "RATE_LIMIT_ENABLED": False,
+    })
+    with app.app_context():
+        db.create_all()
+    yield app
+    mood_writer.stop(5)
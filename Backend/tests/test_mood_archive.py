@@ -0,0 +1,70 @@
+import threading
+import time
+from datetime import datetime
+
+import mood_archive
+from models import db, MoodEntry
+
+
+def archive_five_entries(app):
+    with app.app_context():
+        for day in range(1, 6):
+            db.session.add(MoodEntry(user_id=1, timestamp=datetime(2020, 1, day), mood="happy", note=None))
+        db.session.commit()
+        mood_archive.archive_engine(db.engine, datetime(2020, 2, 1))
+        assert MoodEntry.query.count() == 0
+        return [e["id"] for e in mood_archive.load_moods(1)]
+
+
+def test_concurrent_edits_of_one_month_both_apply(app):
+    ids = archive_five_entries(app)
+    errors = []
+
+    def slow_delete(entry):
+        time.sleep(0.2)  # both edits read the month's blob before either writes it back
+        return None
+
+    def delete(entry_id):
+        try:
+            with app.app_context():
+                assert mood_archive.modify_archived(1, entry_id, slow_delete) == {}
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=delete, args=(entry_id,)) for entry_id in ids[:2]]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    assert errors == []
+    with app.app_context():
+        assert sorted(e["id"] for e in mood_archive.load_moods(1)) == sorted(ids[2:])
+
+
+def test_archiving_waits_for_an_archived_edit(app):
+    ids = archive_five_entries(app)
+    with app.app_context():
+        db.session.add(MoodEntry(user_id=1, timestamp=datetime(2020, 1, 20), mood="sad", note=None))
+        db.session.commit()
+
+    def slow_note(entry):
+        time.sleep(0.2)
+        entry["note"] = "edited"
+        return entry
+
+    def edit():
+        with app.app_context():
+            mood_archive.modify_archived(1, ids[0], slow_note)
+
+    worker = threading.Thread(target=edit)
+    worker.start()
+    time.sleep(0.05)
+    with app.app_context():
+        mood_archive.archive_engine(db.engine, datetime(2020, 2, 1))
+    worker.join()
+
+    with app.app_context():
+        moods = {e["id"]: e for e in mood_archive.load_moods(1)}
+    assert len(moods) == 6
+    assert moods[ids[0]]["note"] == "edited"
@@ -0,0 +1,22 @@
+from datetime import datetime, timedelta
+
+import purge
+from models import db, PurgeJob
+
+
+def test_deny_list_keeps_jobs_finished_within_a_token_lifetime(app):
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add_all([
+            PurgeJob(user_id=1, status="queued"),
+            PurgeJob(user_id=2, status="running"),
+            PurgeJob(user_id=3, status="done", finished_at=now - timedelta(minutes=10)),
+            PurgeJob(user_id=4, status="done", finished_at=now - timedelta(hours=2)),
+            PurgeJob(user_id=5, status="failed", finished_at=now),
+        ])
+        db.session.commit()
+        assert purge.users_being_deleted(db.engine) == {1, 2, 3}
+        assert purge.users_being_deleted(db.engine, {3, 4, 6}) == {3}
+
+        app.config["JWT_ACCESS_TOKEN_EXPIRES"] = False  # tokens never expire
+        assert purge.users_being_deleted(db.engine) == {1, 2, 3, 4}
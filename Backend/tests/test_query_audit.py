@@ -0,0 +1,8 @@
+import query_audit
+
+
+def test_routes_use_indexes():
+    results = query_audit.audit(threshold=100)
+    assert results, "the audit captured no statements"
+    failures = {" ".join(statement.split()): problems for statement, _, problems in results if problems}
+    assert not failures
@@ -0,0 +1,52 @@
+from models import db, Resource
+from recommendations import Recommender, ResourceIndex, MOOD_TAG_AFFINITY, mood_distribution
+
+# The <select> options in client/src/MoodForm.js
+FORM_MOODS = {"happy", "sad", "angry", "anxious", "neutral"}
+
+# Tags of the seeded resources (seed.py)
+CATALOG = [
+    (1, ["anxiety", "mental health", "coping"], True),    # Anxiety guide
+    (2, ["stress", "relaxation", "mental health"], True),
+    (3, ["mindfulness", "anxiety", "meditation"], False),
+    (4, ["depression", "mental health", "symptoms"], True),
+    (5, ["CBT", "therapy", "mental health"], False),
+    (6, ["relaxation", "breathing", "stress relief"], False),
+]
+
+
+def test_every_form_mood_has_affinities():
+    assert set(MOOD_TAG_AFFINITY) == FORM_MOODS
+
+
+def test_anxious_favours_anxiety_resources():
+    index = ResourceIndex()
+    index.add(CATALOG)
+    ranked = index.recommend(mood_distribution(["anxious"] * 3, index.moods), 10)
+    assert set(ranked[:3]) == {1, 3, 6}  # anxiety, and breathing/relaxation
+    assert 4 not in ranked[:3]  # Depression
+
+
+def test_refresh_drops_deleted_resources(app):
+    recommender = Recommender()
+    with app.app_context():
+        db.session.add_all([Resource(title="Depression", tags="depression"),
+                            Resource(title="Coping", tags="coping")])
+        db.session.commit()
+        recommender.refresh()
+        assert len(recommender.recommend(["sad"])) == 2
+
+        # What seed.py does: wipe the table and insert a new catalog
+        Resource.query.delete()
+        db.session.add(Resource(title="Breathing", tags="breathing"))
+        db.session.commit()
+        recommender.refresh()
+        breathing = Resource.query.one()
+        assert breathing.id == 3  # not a reused id
+        assert recommender.recommend(["sad"]) == []
+        assert recommender.recommend(["anxious"]) == [breathing.id]
+
+        db.session.delete(breathing)
+        db.session.commit()
+        recommender.refresh()
+        assert recommender.recommend(["anxious"]) == []
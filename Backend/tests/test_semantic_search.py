@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from semantic_search import Encoder, SearchUnavailable
+
+
+def test_failed_model_load_is_unavailable_and_not_retried(tmp_path, monkeypatch):
+    encoder = Encoder(model_name=str(tmp_path / "no-such-model"))
+    monkeypatch.setenv("HF_HUB_OFFLINE", "1")
+    with pytest.raises(SearchUnavailable):
+        encoder.encode(["hello"])
+
+    calls = []
+    monkeypatch.setattr(encoder, "_fail", lambda message: calls.append(message))
+    with pytest.raises(SearchUnavailable):
+        encoder.encode(["hello"])
+    assert calls == []  # the remembered failure was raised without loading again
+
+
+def test_tiny_local_model(tmp_path):
+    pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+
+    words = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "trouble", "sleeping", "anxiety", "calm"]
+    (tmp_path / "vocab.txt").write_text("\n".join(words) + "\n")
+    transformers.BertTokenizer(str(tmp_path / "vocab.txt")).save_pretrained(tmp_path)
+    config = transformers.BertConfig(vocab_size=len(words), hidden_size=16, num_hidden_layers=1,
+                                     num_attention_heads=2, intermediate_size=32)
+    transformers.BertModel(config).save_pretrained(tmp_path)
+
+    vectors = Encoder(model_name=str(tmp_path)).encode(["trouble sleeping", "calm", "anxiety calm"])
+    assert vectors.shape == (3, 16)
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
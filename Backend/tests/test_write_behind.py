@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import purge
+from models import MoodEntry
+from write_behind import mood_writer
+
+
+def test_failed_batch_does_not_stop_the_writer(app, monkeypatch):
+    real = purge.users_being_deleted
+    calls = []
+
+    def locked_once(engine, user_ids=None):
+        calls.append(user_ids)
+        if len(calls) == 1:
+            raise OperationalError("SELECT", {}, Exception("database is locked"))
+        return real(engine, user_ids)
+
+    monkeypatch.setattr(purge, "users_being_deleted", locked_once)
+
+    with pytest.raises(OperationalError):
+        mood_writer.submit(1, "happy", None).wait(5)
+    assert mood_writer.submit(1, "sad", None).wait(5)
+    with app.app_context():
+        assert [e.mood for e in MoodEntry.query.all()] == ["sad"]
+
+
+def test_dead_writer_thread_is_restarted(app):
+    mood_writer.submit(1, "happy", None).wait(5)
+    thread = mood_writer._thread
+    mood_writer._queue.put(None)  # ends the loop but leaves the thread registered
+    thread.join(5)
+    assert not thread.is_alive()
+
+    assert mood_writer.submit(1, "sad", None).wait(5)
+    assert mood_writer._thread is not thread
+    with app.app_context():
+        assert MoodEntry.query.count() == 2
@@ -0,0 +1,257 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+import purge
+import shards
+from models import db, MoodEntry
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Write-behind mood inserts ----------------
+# With MOOD_WRITE_BEHIND on, add_mood hands its row to a bounded queue and a
+# single writer thread inserts whatever has piled up in one transaction, at
+# most MOOD_FLUSH_MAX_ROWS at a time. Rows that arrive while a batch is being
+# committed go into the next one, so SQLite pays one fsync per batch instead of
+# one per check-in. MOOD_FLUSH_INTERVAL_MS > 0 additionally lingers that long
+# after the first row to collect bigger batches at the cost of latency.
+#
+# MOOD_WRITE_ACK picks the durability trade-off:
+#   "strict" - the request waits until its batch has committed (201)
+#   "queued" - the request returns as soon as the row is queued (202); rows
+#              still in memory are lost if the process dies before a flush
+# A strict request whose batch hasn't committed within MOOD_ACK_TIMEOUT gets
+# 202 as well: the row is still queued and may yet be written, so it must not
+# look like a failure the client should retry.
+
+
+class WriterBusy(Exception):
+    """The write-behind queue is full."""
+
+
+class InvalidMood(ValueError):
+    """The row would fail its insert (and, in a batch, everyone else's)."""
+
+
+class PendingMood:
+    def __init__(self, row):
+        self.row = row
+        self.id = None
+        self.error = None
+        self._done = threading.Event()
+
+    def resolve(self, entry_id):
+        self.id = entry_id
+        if self.row is not None:
+            self.row["id"] = entry_id
+        self._done.set()
+
+    def fail(self, error):
+        self.error = error
+        self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the row is committed and return its id."""
+        if not self._done.wait(timeout):
+            raise TimeoutError("mood entry was not flushed in time")
+        if self.error is not None:
+            raise self.error
+        return self.id
+
+
+class MoodWriter:
+    def __init__(self, app=None):
+        self.app = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("MOOD_WRITE_BEHIND", False)
+        app.config.setdefault("MOOD_WRITE_ACK", "strict")
+        app.config.setdefault("MOOD_FLUSH_INTERVAL_MS", 0)
+        app.config.setdefault("MOOD_FLUSH_MAX_ROWS", 200)
+        app.config.setdefault("MOOD_QUEUE_SIZE", 5000)
+        app.config.setdefault("MOOD_ACK_TIMEOUT", 5.0)
+        self.app = app
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config["MOOD_WRITE_BEHIND"]
+
+    @property
+    def strict(self):
+        return self.app.config["MOOD_WRITE_ACK"] == "strict"
+
+    def on_commit(self, callback):
+        """Register callback(row) to run for each row after its batch commits."""
+        self._callbacks.append(callback)
+        return callback
+
+    def submit(self, user_id, mood, note):
+        if not isinstance(mood, str) or not mood.strip():
+            raise InvalidMood("Mood is required")
+        if len(mood) > MoodEntry.__table__.c.mood.type.length:
+            raise InvalidMood("Mood is too long")
+        if note is not None and not isinstance(note, str):
+            raise InvalidMood("Note must be text")
+        self._ensure_started()
+        pending = PendingMood({
+            "user_id": user_id,
+            "timestamp": datetime.utcnow(),
+            "mood": mood,
+            "note": note,
+        })
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            raise WriterBusy()
+        return pending
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far has been written."""
+        if self._queue is None:
+            return
+        marker = PendingMood(None)
+        self._queue.put(marker)
+        marker.wait(timeout)
+
+    def stop(self, timeout=None):
+        with self._lock:
+            thread, q = self._thread, self._queue
+            self._thread = self._queue = None
+        if thread is not None and thread.is_alive():
+            q.put(None)
+            thread.join(timeout)
+
+    def _running(self):
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def _ensure_started(self):
+        # Threads don't survive gunicorn's fork, so each worker starts its own;
+        # a writer that died is replaced and picks up what was already queued
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            if self._queue is None or self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.app.config["MOOD_QUEUE_SIZE"])
+                if self._pid is None:
+                    atexit.register(self.stop, 5)
+                self._pid = os.getpid()
+            else:
+                logger.error("Mood writer thread had stopped, restarting it")
+            self._thread = threading.Thread(
+                target=self._run, args=(self._queue,), name="mood-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self, q):
+        interval = self.app.config["MOOD_FLUSH_INTERVAL_MS"] / 1000.0
+        max_rows = self.app.config["MOOD_FLUSH_MAX_ROWS"]
+        with self.app.app_context():
+            self._loop(q, interval, max_rows)
+
+    def _loop(self, q, interval, max_rows):
+        stopping = False
+        while not stopping:
+            first = q.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + interval
+            while len(batch) < max_rows:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = q.get(timeout=remaining)
+                    else:
+                        # Past the linger window: still take whatever is already queued
+                        item = q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._flush_batch(batch)
+            except Exception as e:
+                # e.g. "database is locked" looking up purge jobs: fail this
+                # batch but keep the writer alive for the next one
+                logger.exception("Mood write-behind batch failed")
+                for p in batch:
+                    if p.done:
+                        continue
+                    if p.row is None:
+                        p.resolve(None)
+                    else:
+                        p.fail(e)
+
+    def _flush_batch(self, batch):
+        markers = [p for p in batch if p.row is None]
+        rows = [p for p in batch if p.row is not None]
+        # Callers may not have looked the user up (mood_routes trusts the token),
+        # so don't write rows for accounts being purged; one query per batch
+        gone = purge.users_being_deleted(db.engine, {p.row["user_id"] for p in rows}) if rows else set()
+        by_engine = {}
+        for p in rows:
+            if p.row["user_id"] in gone:
+                p.fail(purge.AccountDeleted())
+            else:
+                by_engine.setdefault(shards.engine_for_user(db, p.row["user_id"]), []).append(p)
+        table = MoodEntry.__table__
+        stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        written = []
+        # One transaction per shard (a single one when sharding is off)
+        for engine, rows in by_engine.items():
+            try:
+                with engine.begin() as conn:
+                    ids = conn.execute(stmt, [p.row for p in rows]).scalars().all()
+            except Exception:
+                if len(rows) == 1:
+                    logger.exception("Mood write-behind insert failed")
+                    rows[0].fail(sys.exc_info()[1])
+                    continue
+                # One bad row fails the whole executemany: redo them one by
+                # one so only that row's request sees the error
+                logger.warning("Mood write-behind batch of %d rows failed, retrying singly", len(rows))
+                for p in rows:
+                    try:
+                        with engine.begin() as conn:
+                            p.resolve(conn.execute(stmt, [p.row]).scalar_one())
+                    except Exception as e:
+                        logger.exception("Mood write-behind insert failed")
+                        p.fail(e)
+                    else:
+                        written.append(p)
+            else:
+                for p, entry_id in zip(rows, ids):
+                    p.resolve(entry_id)
+                written.extend(rows)
+        for p in written:
+            for callback in self._callbacks:
+                try:
+                    callback(p.row)
+                except Exception:
+                    logger.exception("Mood write-behind callback failed")
+        for marker in markers:
+            marker.resolve(None)
+
+
+mood_writer = MoodWriter()
@@ -41,6 +41,28 @@ const Bookings = () => {
 
   useEffect(() => {
     fetchBookings();
+
+    // Live deltas from the server, including changes made from other devices
+    const token = localStorage.getItem('token');
+    const source = new EventSource(`${API_BASE_URL}/api/events?jwt=${encodeURIComponent(token)}`);
+    const upsert = (e) => {
+      const booking = JSON.parse(e.data);
+      setBookings((prev) =>
+        prev.some((b) => b.id === booking.id)
+          ? prev.map((b) => (b.id === booking.id ? booking : b))
+          : [...prev, booking]
+      );
+    };
+    source.addEventListener('booking.created', upsert);
+    source.addEventListener('booking.updated', upsert);
+    source.addEventListener('booking.deleted', (e) => {
+      const { id } = JSON.parse(e.data);
+      setBookings((prev) => prev.filter((b) => b.id !== id));
+    });
+    source.addEventListener('resync', fetchBookings);
+    // Token expired or account is being deleted: don't reconnect
+    source.addEventListener('end', () => source.close());
+    return () => source.close();
   }, []);
 
   const handleDelete = async (bookingId) => {
@@ -54,7 +76,7 @@ const Bookings = () => {
       if (res.ok) {
         setSuccessMsg('Booking cancelled successfully.');
         setErrorMsg('');
-        fetchBookings();
+        setBookings((prev) => prev.filter((b) => b.id !== bookingId));
       } else {
         setErrorMsg('Failed to cancel booking.');
         setSuccessMsg('');
@@ -100,7 +122,11 @@ const Bookings = () => {
         setSuccessMsg('Booking updated successfully.');
         setErrorMsg('');
         setEditingId(null);
-        fetchBookings();
+        setBookings((prev) =>
+          prev.map((b) =>
+            b.id === bookingId ? { ...b, day: editedDay.trim(), slot: editedSlot.trim() } : b
+          )
+        );
       } else {
         const data = await res.json();
         setErrorMsg(data.error || 'Failed to update booking.');
@@ -1,4 +1,4 @@
-import React, { useEffect, useState, useMemo } from 'react';
+import React, { useEffect, useState, useMemo, useRef } from 'react';
 import axios from 'axios';
 import {
   LineChart, Line, XAxis, YAxis, Tooltip, CartesianGrid, ResponsiveContainer
@@ -35,6 +35,16 @@ const moodIcons = {
   angry: '😠',
 };
 
+// Add chart fields (numeric date and mood value) to an entry from the API
+const toChartEntry = (mood) => {
+  const parsedDate = new Date(mood.timestamp || mood.date);
+  return {
+    ...mood,
+    moodValue: moodScale[mood.mood.toLowerCase()] || 0,
+    date: parsedDate.getTime() || Date.now()
+  };
+};
+
 // Format date for display
 const formatDate = (ts) =>
   new Date(ts).toLocaleDateString(undefined, {
@@ -73,23 +83,21 @@ const MoodHistory = () => {
   const [dateFrom, setDateFrom] = useState('');
   const [dateTo, setDateTo] = useState('');
   const [openIndex, setOpenIndex] = useState(null);
+  // Read by the SSE resync handler, which is registered once
+  const range = useRef({ dateFrom: '', dateTo: '' });
 
   const fetchMoods = async () => {
     try {
       const token = localStorage.getItem('token');
+      // Without dates the server returns the last year; older (archived)
+      // entries are only loaded for an explicit range
+      const { dateFrom, dateTo } = range.current;
       const response = await axios.get(`${API_URL}/api/moods`, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-
-      const converted = response.data.map(mood => {
-        const parsedDate = new Date(mood.timestamp || mood.date);
-        return {
-          ...mood,
-          moodValue: moodScale[mood.mood.toLowerCase()] || 0,
-          date: parsedDate.getTime() || Date.now()
-        };
+        headers: { Authorization: `Bearer ${token}` },
+        params: { from: dateFrom || undefined, to: dateTo || undefined }
       });
 
+      const converted = response.data.map(toChartEntry);
       converted.sort((a, b) => a.date - b.date);
       setMoods(converted);
     } catch (err) {
@@ -100,7 +108,30 @@ const MoodHistory = () => {
   };
 
   useEffect(() => {
+    range.current = { dateFrom, dateTo };
     fetchMoods();
+  }, [dateFrom, dateTo]);
+
+  useEffect(() => {
+    // Live deltas from the server so changes made elsewhere show up without refetching
+    const token = localStorage.getItem('token');
+    const source = new EventSource(`${API_URL}/api/events?jwt=${encodeURIComponent(token)}`);
+    const upsert = (e) => {
+      const entry = toChartEntry(JSON.parse(e.data));
+      setMoods(prev =>
+        [...prev.filter(m => m.id !== entry.id), entry].sort((a, b) => a.date - b.date)
+      );
+    };
+    source.addEventListener('mood.created', upsert);
+    source.addEventListener('mood.updated', upsert);
+    source.addEventListener('mood.deleted', (e) => {
+      const { id } = JSON.parse(e.data);
+      setMoods(prev => prev.filter(m => m.id !== id));
+    });
+    source.addEventListener('resync', fetchMoods);
+    // Token expired or account is being deleted: don't reconnect
+    source.addEventListener('end', () => source.close());
+    return () => source.close();
   }, []);
 
   const deleteMood = async (id) => {
@@ -135,7 +166,7 @@ const MoodHistory = () => {
     return <div style={spinnerStyle} />;
   }
 
-  if (moods.length === 0) {
+  if (moods.length === 0 && !dateFrom && !dateTo) {
     return (
       <div style={{ textAlign: 'center', padding: 40, color: '#6B7280', fontStyle: 'italic' }}>
         <span role="img" aria-label="empty" style={{ fontSize: 30, marginRight: 8 }}>😔</span> No moods logged yet. Start by adding one!